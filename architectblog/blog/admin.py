@@ -1,9 +1,25 @@
 from django.contrib import admin
-from .models import Entry, Tag, Quotation, Blogmark, Series
+from django.contrib.admin.views.main import ChangeList
+from .models import Entry, Tag, Quotation, Blogmark, Series, Job
 from django.db.models.functions import Length
 
 
-class BaseAdmin(admin.ModelAdmin):
+class ListingChangeList(ChangeList):
+    """A changelist of content items, loaded as they are for listings"""
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).for_listing()
+        if "tag_summary" in self.list_display:
+            queryset = queryset.prefetch_related("tags")
+        return queryset
+
+
+class ListingAdminMixin:
+    def get_changelist(self, request, **kwargs):
+        return ListingChangeList
+
+
+class BaseAdmin(ListingAdminMixin, admin.ModelAdmin):
     date_hierarchy = "created_time"
     raw_id_fields = ("tags",)
     list_display = ("__str__", "slug", "created_time", "tag_summary")
@@ -12,7 +28,7 @@ class BaseAdmin(admin.ModelAdmin):
 
 
 @admin.register(Entry)
-class EntryAdmin(admin.ModelAdmin):
+class EntryAdmin(ListingAdminMixin, admin.ModelAdmin):
     date_hierarchy = "created_time"
     list_display = ("__str__", "slug", "created_time", "status")
     autocomplete_fields = ("tags",)
@@ -65,6 +81,7 @@ class BlogmarkAdmin(BaseAdmin):
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     search_fields = ("tag",)
+    list_display = ("tag", "entry_count", "blogmark_count", "quotation_count")
     fieldsets = [
         (
             None,
@@ -92,3 +109,10 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Series)
 class SeriesAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("title",)}
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "status", "attempts", "run_after", "created_time")
+    list_filter = ("status", "task")
+    readonly_fields = ("task", "payload", "attempts", "created_time", "last_error")
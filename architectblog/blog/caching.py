@@ -0,0 +1,199 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date
+
+CONTENT_VERSION_KEY = "blog:content-version"
+DEPENDENCY_KEY = "blog:dep:%s"
+PAGE_KEY = "blog:page:%s"
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+FRAGMENT_KEY = "blog:fragment:%s:%s:%s:%d"
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# Set in request.META by render_static. Real requests can't carry it, as
+# headers only ever arrive as HTTP_* keys.
+STATIC_BUILD_KEY = "blog.static_build"
+
+TIMELINE_DEPENDENCY = "timeline"
+POPULAR_DEPENDENCY = "popular"
+
+
+def get_content_version():
+    """
+    A token that changes whenever any Entry, Blogmark, Quotation or Tag does.
+    Folding it into a cache key retires everything cached under older keys.
+    """
+    version = cache.get(CONTENT_VERSION_KEY)
+    if version is None:
+        cache.add(CONTENT_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CONTENT_VERSION_KEY)
+    return version
+
+
+def bump_content_version():
+    cache.set(CONTENT_VERSION_KEY, time.time_ns(), None)
+
+
+def item_dependency(type_name, pk):
+    return "item:%s:%s" % (type_name, pk)
+
+
+def tag_dependency(tag_id):
+    return "tag:%s" % tag_id
+
+
+def date_dependency(year, month=None, day=None):
+    """The year, month or day archive bucket, such as date:2021-03"""
+    return "date:" + "-".join(
+        "%02d" % part for part in (year, month, day) if part is not None
+    )
+
+
+def date_dependencies(created_time):
+    """The year, month and day archive buckets an item falls into"""
+    local_time = timezone.localtime(created_time, timezone.get_default_timezone())
+    return [
+        date_dependency(local_time.year),
+        date_dependency(local_time.year, local_time.month),
+        date_dependency(local_time.year, local_time.month, local_time.day),
+    ]
+
+
+def fragment_key(obj, showdate):
+    """
+    Cache key for an item's rendered listing markup. Saving the item, or
+    changing its tags, moves updated_time on, so stale copies are never read.
+    """
+    return FRAGMENT_KEY % (
+        obj.type,
+        obj.pk,
+        obj.updated_time.strftime("%Y%m%d%H%M%S%f"),
+        showdate,
+    )
+
+
+def invalidate(dependencies):
+    """
+    Marks every cached page depending on any of these as stale, once the
+    current transaction commits.
+    """
+    keys = {DEPENDENCY_KEY % dependency for dependency in dependencies}
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), None)
+        )
+
+
+def get_dependency_versions(dependencies, initial=None):
+    """
+    Current version of each dependency, as a {dependency: version} dict.
+    Dependencies that have never been invalidated (or have been evicted) are
+    given the version `initial`, defaulting to now.
+
+    The versions only live in the cache, so losing one looks the same as an
+    invalidation: every page depending on it is rendered again and gets a
+    new ETag and Last-Modified, making clients download it in full once.
+    The keys are stored without a timeout and are small, but a cache that
+    culls entries when full (the database cache does so past MAX_ENTRIES)
+    will drop some. Size it so that it rarely has to.
+    """
+    keys = {dependency: DEPENDENCY_KEY % dependency for dependency in dependencies}
+    found = cache.get_many(keys.values())
+    initial = initial or time.time_ns()
+    missing = {key: initial for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {dependency: found[key] for dependency, key in keys.items()}
+
+
+def set_validators(response, versions):
+    """
+    Sets an ETag and Last-Modified derived from the dependency versions a
+    page was built from, and asks clients to revalidate on every use.
+    """
+    digest = hashlib.md5(repr(sorted(versions.items())).encode()).hexdigest()
+    response["ETag"] = '"%s"' % digest
+    if versions:
+        response["Last-Modified"] = http_date(max(versions.values()) // 10**9)
+    patch_cache_control(response, no_cache=True)
+
+
+def conditional_response(request, response):
+    """The response, or a 304 if the client's copy is still current"""
+    last_modified = response.get("Last-Modified")
+    return get_conditional_response(
+        request,
+        etag=response["ETag"],
+        last_modified=last_modified and parse_http_date(last_modified),
+        response=response,
+    )
+
+
+class PageCacheMixin:
+    """
+    Caches whole responses to anonymous GET requests. While handling the
+    request the view declares what the page shows with depends_on(); the
+    cached copy is served only until one of those dependencies is
+    invalidated.
+
+    The same dependency versions make the page's ETag and Last-Modified, so
+    a client revalidating a cached page gets its 304 from a couple of cache
+    reads, without a query or any rendering.
+
+    Pages rendered by render_static bypass the cache, and see static_build
+    set in their context so that they can leave out links to query string
+    pages, which a static copy of the site doesn't have.
+    """
+
+    page_cache_timeout = PAGE_CACHE_TIMEOUT
+
+    def depends_on(self, *dependencies):
+        self.page_dependencies.update(dependencies)
+
+    def depends_on_items(self, objects):
+        self.depends_on(*[item_dependency(obj.type, obj.pk) for obj in objects])
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["static_build"] = bool(self.request.META.get(STATIC_BUILD_KEY))
+        return context
+
+    def dispatch(self, request, *args, **kwargs):
+        self.page_dependencies = set()
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.user.is_authenticated
+            or request.META.get(STATIC_BUILD_KEY)
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = PAGE_KEY % hashlib.md5(request.get_full_path().encode()).hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            if get_dependency_versions(cached["versions"]) == cached["versions"]:
+                return conditional_response(request, cached["response"])
+
+        started = time.time_ns()
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code != 200 or response.cookies:
+            return response
+        if hasattr(response, "render"):
+            # Dependencies are only all known once the template has run
+            response.render()
+
+        versions = get_dependency_versions(self.page_dependencies, started)
+        set_validators(response, versions)
+        # Anything invalidated while we were rendering may not be in the page,
+        # so only store it if nothing was
+        if all(version <= started for version in versions.values()):
+            cache.set(
+                key,
+                {"response": response, "versions": versions},
+                self.page_cache_timeout,
+            )
+        return conditional_response(request, response)
@@ -0,0 +1,20 @@
+import math
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+EXCERPT_WORDS = 75
+WORDS_PER_MINUTE = 200
+
+
+def summarize(content):
+    """
+    The (excerpt_html, word_count, reading_minutes) stored alongside an
+    entry's HTML content. Kept apart from the model so that data migrations
+    compute them the same way.
+    """
+    excerpt_html = Truncator(content).words(EXCERPT_WORDS, html=True, truncate=" …")
+    # Space out the tags so that adjacent paragraphs don't run together
+    word_count = len(strip_tags(content.replace("<", " <")).split())
+    reading_minutes = max(1, math.ceil(word_count / WORDS_PER_MINUTE))
+    return excerpt_html, word_count, reading_minutes
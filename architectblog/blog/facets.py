@@ -0,0 +1,147 @@
+import datetime
+import hashlib
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
+
+from .caching import get_content_version
+from .models import CONTENT_MODELS, Tag, TimelineItem
+
+FACET_CACHE_TIMEOUT = 60 * 60
+TAG_FACET_LIMIT = 40
+
+TYPE_YEAR_MONTH_SQL = """
+    SELECT GROUPING(f.type), GROUPING(f.year), f.type, f.year, f.month, COUNT(*)
+    FROM (%s) f
+    GROUP BY GROUPING SETS ((f.type), (f.year), (f.month))
+"""
+
+TAG_SQL = """
+    SELECT t.tag, COUNT(*) FROM (%s) f
+        CROSS JOIN LATERAL unnest(f.tag_ids) AS u (tag_id)
+        JOIN blog_tag t ON t.id = u.tag_id
+    GROUP BY t.tag
+    ORDER BY COUNT(*) DESC, t.tag
+    LIMIT %d
+"""
+
+
+class SearchFilters:
+    """The normalized set of filters that a search page request applies"""
+
+    def __init__(self, q="", tags=(), excluded_tags=(), type="", year="", month=""):
+        self.q = q.strip()
+        self.tags = sorted(set(tags))
+        self.excluded_tags = sorted(set(excluded_tags))
+        self.type = type
+        self.year = int(year) if year.isdigit() and 2000 <= int(year) else None
+        self.month = int(month) if month.isdigit() and 1 <= int(month) <= 12 else None
+
+    @classmethod
+    def from_request(cls, request):
+        return cls(
+            q=request.GET.get("q", ""),
+            tags=request.GET.getlist("tag"),
+            excluded_tags=request.GET.getlist("exclude.tag"),
+            type=request.GET.get("type", ""),
+            year=request.GET.get("year", ""),
+            month=request.GET.get("month", ""),
+        )
+
+    def cache_key(self):
+        normalized = repr(
+            (
+                self.q,
+                self.tags,
+                self.excluded_tags,
+                self.type,
+                self.year,
+                self.month,
+            )
+        )
+        return "blog:search-facets:%s:%s" % (
+            get_content_version(),
+            hashlib.md5(normalized.encode("utf-8")).hexdigest(),
+        )
+
+    def timeline(self):
+        """The TimelineItem rows matching these filters"""
+        qs = TimelineItem.objects.all()
+        if self.type:
+            qs = qs.filter(type=self.type)
+        if self.year:
+            qs = qs.filter(year=self.year)
+        if self.month:
+            qs = qs.filter(month=self.month)
+        if self.tags or self.excluded_tags:
+            tag_ids = dict(
+                Tag.objects.filter(tag__in=self.tags + self.excluded_tags).values_list(
+                    "tag", "pk"
+                )
+            )
+            if any(tag not in tag_ids for tag in self.tags):
+                return qs.none()
+            if self.tags:
+                qs = qs.filter(tag_ids__contains=[tag_ids[tag] for tag in self.tags])
+            excluded = [tag_ids[tag] for tag in self.excluded_tags if tag in tag_ids]
+            if excluded:
+                qs = qs.exclude(tag_ids__overlap=excluded)
+        if self.q:
+            query = SearchQuery(self.q, search_type="websearch")
+            matches = models.Q()
+            for type_name, model in CONTENT_MODELS.items():
+                matches |= models.Q(
+                    type=type_name,
+                    object_id__in=model.objects.filter(search_document=query).values(
+                        "pk"
+                    ),
+                )
+            qs = qs.filter(matches)
+        return qs
+
+
+def compute_facets(filters):
+    """
+    Counts the items matching filters by type, year, month (only once a year
+    has been selected) and tag, in two grouped queries.
+    """
+    facets = {"total": 0, "types": [], "years": [], "months": [], "tags": []}
+    try:
+        sql, params = (
+            filters.timeline()
+            .order_by()
+            .values("type", "year", "month", "tag_ids")
+            .query.sql_with_params()
+        )
+    except EmptyResultSet:
+        return facets
+    with connection.cursor() as cursor:
+        cursor.execute(TYPE_YEAR_MONTH_SQL % sql, params)
+        for by_type, by_year, type_name, year, month, n in cursor.fetchall():
+            if not by_type:
+                facets["types"].append({"type": type_name, "n": n})
+                facets["total"] += n
+            elif not by_year:
+                facets["years"].append({"year": datetime.date(year, 1, 1), "n": n})
+            elif filters.year:
+                facets["months"].append(
+                    {"month": datetime.date(filters.year, month, 1), "n": n}
+                )
+        cursor.execute(TAG_SQL % (sql, TAG_FACET_LIMIT), params)
+        facets["tags"] = [{"tag": tag, "n": n} for tag, n in cursor.fetchall()]
+    facets["types"].sort(key=lambda t: t["n"], reverse=True)
+    facets["years"].sort(key=lambda t: t["year"])
+    facets["months"].sort(key=lambda t: t["month"])
+    return facets
+
+
+def search_facets(filters):
+    """compute_facets(), cached until the content next changes"""
+    key = filters.cache_key()
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(filters)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
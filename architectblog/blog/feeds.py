@@ -0,0 +1,111 @@
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.html import format_html
+from django.views.generic.base import View
+
+from .caching import (
+    TIMELINE_DEPENDENCY,
+    PageCacheMixin,
+    item_dependency,
+    tag_dependency,
+)
+from .models import MixedObjectLoader, Tag, TimelineItem
+
+FEED_ITEMS = 30
+# How each type is named in its feed's title, matching the feed URLs
+FEED_NAMES = {"entry": "entries", "blogmark": "links", "quotation": "quotes"}
+
+
+class ItemsFeed(Feed):
+    """
+    Atom feed of the newest published items, optionally limited to one type
+    or one tag. The items come from a single ordered query on the timeline.
+    Everything the feed shows is collected in self.dependencies, for
+    FeedView to hand to the page cache.
+    """
+
+    feed_type = Atom1Feed
+    subtitle = "A place for everything"
+
+    def get_object(self, request, type_name=None, tag=None):
+        self.dependencies = [TIMELINE_DEPENDENCY]
+        self.loader = MixedObjectLoader.for_request(request)
+        self.type_name = type_name
+        if tag is not None:
+            tag = get_object_or_404(Tag, tag=tag)
+            self.dependencies.append(tag_dependency(tag.pk))
+        return tag
+
+    def title(self, tag):
+        if tag is not None:
+            return "Architect: %s" % tag.tag
+        if self.type_name:
+            return "Architect: %s" % FEED_NAMES[self.type_name]
+        return "Architect"
+
+    def link(self, tag):
+        if tag is not None:
+            return reverse("blog:tag_detail", args=[tag.tag])
+        return reverse("blog:home")
+
+    def items(self, tag):
+        rows = TimelineItem.objects.filter(status="p")
+        if self.type_name:
+            rows = rows.filter(type=self.type_name)
+        if tag is not None:
+            rows = rows.filter(tag_ids__contains=[tag.pk])
+        items = [
+            obj
+            for obj in self.loader.load(
+                [row.as_dict() for row in rows[:FEED_ITEMS]], fields=["content"]
+            )
+            if obj
+        ]
+        self.dependencies.extend(item_dependency(obj.type, obj.pk) for obj in items)
+        return items
+
+    def item_title(self, item):
+        if item.type == "blogmark":
+            return item.link_title
+        if item.type == "quotation":
+            return "Quoting %s" % item.source
+        return item.title
+
+    def item_description(self, item):
+        if item.type == "blogmark":
+            return format_html(
+                '<p><a href="{}">{}</a></p><p>{}</p>',
+                item.link_url,
+                item.link_title,
+                item.commentary,
+            )
+        if item.type == "quotation":
+            return format_html(
+                "<blockquote><p>{}</p></blockquote><p>&mdash; {}</p>",
+                item.quotation,
+                item.source,
+            )
+        return item.content
+
+    def item_pubdate(self, item):
+        return item.created_time
+
+    def item_updateddate(self, item):
+        return item.updated_time
+
+    def item_categories(self, item):
+        return [tag.tag for tag in item.tags.all()]
+
+
+class FeedView(PageCacheMixin, View):
+    """Serves an ItemsFeed through the page cache, conditional GET included"""
+
+    type_name = None
+
+    def get(self, request, *args, **kwargs):
+        feed = ItemsFeed()
+        response = feed(request, type_name=self.type_name, **kwargs)
+        self.depends_on(*feed.dependencies)
+        return response
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from architectblog.blog.caching import invalidate, item_dependency
+from architectblog.blog.models import Entry
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute excerpt_html, word_count and reading_minutes for entries "
+        "whose stored values are missing or out of date"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=200)
+
+    def handle(self, *args, **options):
+        fields = Entry.EXCERPT_FIELDS + ("updated_time",)
+        checked = updated = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                Entry.objects.filter(pk__gt=last_pk)
+                .only("pk", "content", *Entry.EXCERPT_FIELDS)
+                .order_by("pk")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            changed = []
+            for entry in batch:
+                before = [getattr(entry, field) for field in Entry.EXCERPT_FIELDS]
+                entry.update_excerpt()
+                if before != [getattr(entry, field) for field in Entry.EXCERPT_FIELDS]:
+                    # Retires cached fragments rendered with the old values
+                    entry.updated_time = timezone.now()
+                    changed.append(entry)
+            if changed:
+                Entry.objects.bulk_update(changed, fields)
+                invalidate([item_dependency("entry", entry.pk) for entry in changed])
+                updated += len(changed)
+
+        self.stdout.write("%d entries checked, %d updated" % (checked, updated))
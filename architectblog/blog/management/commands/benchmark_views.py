@@ -0,0 +1,232 @@
+import json
+import os
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.test import Client
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from django.urls import reverse
+
+from architectblog.blog.models import (
+    Blogmark,
+    Entry,
+    Quotation,
+    Tag,
+    date_url_kwargs,
+)
+from architectblog.blog.querybudget import QueryRecorder
+from architectblog.blog.seeding import seed
+from architectblog.blog.sitemaps import published, shard_of
+
+SIZES = "1000,10000,100000,1000000"
+# Share of the items of each type, roughly as on the live site
+MIX = (
+    ("entries", Entry, 0.2),
+    ("blogmarks", Blogmark, 0.65),
+    ("quotations", Quotation, 0.15),
+)
+ITEMS_PER_TAG = 25
+SEARCH_TERM = "design"
+
+
+def sample_urls():
+    """
+    {URL name: URL} with one representative URL for every pattern in
+    blog/urls.py, picked from what is in the database: the newest items,
+    their dates and the most used tag.
+    """
+    entry = published("entry").latest("pub_time")
+    link = Blogmark.objects.latest("created_time")
+    quote = Quotation.objects.latest("created_time")
+    tag = Tag.objects.order_by(
+        (
+            models.F("entry_count")
+            + models.F("blogmark_count")
+            + models.F("quotation_count")
+        ).desc()
+    )[0]
+    date = date_url_kwargs(entry.created_time)
+    year, month = date["year"], date["month"]
+    return {
+        "home": reverse("blog:home"),
+        "entry_detail": entry.get_absolute_url(),
+        "link_detail": link.get_absolute_url(),
+        "quote_detail": quote.get_absolute_url(),
+        "entry_archive_year": reverse("blog:entry_archive_year", args=[year]),
+        "entry_archive_month": reverse("blog:entry_archive_month", args=[year, month]),
+        "entry_archive_day": reverse("blog:entry_archive_day", kwargs=date),
+        "archive_view": reverse("blog:archive_view"),
+        "archive_month_items": reverse(
+            "blog:archive_month_items", args=[year, int(month)]
+        ),
+        "search": reverse("blog:search") + "?q=" + SEARCH_TERM,
+        "tag_detail": tag.get_absolute_url(),
+        "tag_feed": reverse("blog:tag_feed", args=[tag.tag]),
+        "feed": reverse("blog:feed"),
+        "entry_feed": reverse("blog:entry_feed"),
+        "link_feed": reverse("blog:link_feed"),
+        "quote_feed": reverse("blog:quote_feed"),
+        "sitemap": reverse("blog:sitemap"),
+        "sitemap_shard": reverse(
+            "blog:sitemap_shard", args=["entry", shard_of(entry.pk)]
+        ),
+        "popular": reverse("blog:popular"),
+        "popular_period": reverse("blog:popular_period", args=["day"]),
+    }
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if response.streaming:
+        b"".join(response.streaming_content)
+    if response.status_code != 200:
+        raise CommandError("%s returned %d" % (url, response.status_code))
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(__file__),
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every blog URL against a throwaway database seeded to "
+        "each of the given sizes, reporting latency, query counts and peak "
+        "memory as JSON. Every request is made with an empty cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default=SIZES,
+            help="Comma separated item counts to seed and benchmark at, "
+            "smallest first (default: %s)" % SIZES,
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Requests timed per URL"
+        )
+        parser.add_argument("--output", help="File to write (default: stdout)")
+        parser.add_argument(
+            "--no-search-index",
+            action="store_true",
+            help="Seed without search documents, which is much faster",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes must be a list like 1000,10000")
+        if sizes != sorted(sizes) or sizes[0] < 1:
+            raise CommandError("--sizes must be positive and in increasing order")
+        if options["repeat"] < 2:
+            raise CommandError("--repeat must be at least 2")
+
+        report = {"commit": current_commit(), "repeat": options["repeat"], "sizes": []}
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                CACHES={
+                    "default": {
+                        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                        "LOCATION": "benchmark_views",
+                    }
+                },
+                BLOG_QUERY_STATS=False,
+            ):
+                for size in sizes:
+                    self.grow(size, not options["no_search_index"])
+                    report["sizes"].append(
+                        {"items": size, "urls": self.benchmark(size, options["repeat"])}
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+    def grow(self, size, index_search):
+        """Seeds items, split by MIX, until there are size of them"""
+        counts = {
+            option: max(0, round(size * share) - model.objects.count())
+            for option, model, share in MIX
+        }
+        started = time.monotonic()
+        seed(
+            tags=max(0, size // ITEMS_PER_TAG - Tag.objects.count()),
+            random_seed=size,
+            index_search=index_search,
+            **counts,
+        )
+        self.stderr.write(
+            "Seeded %d items in %.1fs" % (size, time.monotonic() - started)
+        )
+
+    def benchmark(self, size, repeat):
+        client = Client()
+        results = {}
+        for name, url in sample_urls().items():
+            # Measured apart from the timings, as tracing slows everything
+            # down. This also warms up template loading for the timed runs.
+            cache.clear()
+            tracemalloc.start()
+            try:
+                fetch(client, url)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+            timings = []
+            for _ in range(repeat):
+                cache.clear()
+                recorder = QueryRecorder()
+                start = time.perf_counter()
+                with connection.execute_wrapper(recorder):
+                    fetch(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+
+            percentiles = statistics.quantiles(timings, n=20)
+            results[name] = {
+                "url": url,
+                "p50_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(percentiles[18], 2),
+                "queries": recorder.count,
+                "query_ms": round(recorder.duration * 1000, 2),
+                "peak_memory_kb": peak // 1024,
+            }
+            self.stderr.write(
+                "%d items, %s: p50 %.1fms, p95 %.1fms, %d queries"
+                % (
+                    size,
+                    name,
+                    results[name]["p50_ms"],
+                    results[name]["p95_ms"],
+                    recorder.count,
+                )
+            )
+        return results
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from architectblog.blog.caching import POPULAR_DEPENDENCY, invalidate
+from architectblog.blog.models import EntryViewDelta
+
+
+class Command(BaseCommand):
+    help = (
+        "Add the page views recorded since the last run to Entry.views and "
+        "the popular entries leaderboard. "
+        "Meant to be run every minute or so from cron."
+    )
+
+    def handle(self, *args, **options):
+        updated = EntryViewDelta.objects.flush()
+        if updated:
+            invalidate([POPULAR_DEPENDENCY])
+        self.stdout.write("%d entries updated" % updated)
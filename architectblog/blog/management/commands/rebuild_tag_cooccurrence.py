@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from architectblog.blog.models import TagCooccurrence
+
+
+class Command(BaseCommand):
+    help = "Recompute the tag co-occurrence table from the tag assignments"
+
+    def handle(self, *args, **options):
+        pairs = TagCooccurrence.objects.rebuild()
+        self.stdout.write("%d tag pairs" % pairs)
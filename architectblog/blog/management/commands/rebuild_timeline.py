@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from architectblog.blog.models import CONTENT_MODELS, MonthlyRollup, TimelineItem
+
+COLUMNS = "type, object_id, created_time, status, year, month, day, tag_ids"
+
+DRIFT_SQL = """
+    SELECT
+        (SELECT COUNT(*) FROM (%(expected)s EXCEPT %(actual)s) missing_or_stale),
+        (SELECT COUNT(*) FROM (%(actual)s EXCEPT %(expected)s) orphaned_or_stale)
+"""
+
+ROLLUP_SQL = """
+    SELECT year, month, type, COUNT(*) FROM %(timeline)s
+        GROUP BY year, month, type
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild (or with --verify, check) the denormalized blog timeline "
+        "and its monthly rollups"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Report drift between the timeline and the content tables "
+            "without changing anything",
+        )
+
+    def handle(self, *args, **options):
+        table = TimelineItem._meta.db_table
+        for type_name in CONTENT_MODELS:
+            sql, params = TimelineItem.objects.source_sql(type_name)
+            if options["verify"]:
+                self.verify(table, type_name, sql, params)
+            else:
+                self.rebuild(table, type_name, sql, params)
+        if options["verify"]:
+            self.verify_rollups(table)
+        else:
+            MonthlyRollup.objects.rebuild()
+            self.stdout.write("monthly rollups: rebuilt")
+
+    def rebuild(self, table, type_name, sql, params):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s WHERE type = %%s" % table, [type_name])
+            cursor.execute(
+                "INSERT INTO %s (%s) SELECT %s FROM (%s) source"
+                % (table, COLUMNS, COLUMNS, sql),
+                params,
+            )
+            self.stdout.write("%s: %d rows" % (type_name, cursor.rowcount))
+
+    def verify(self, table, type_name, sql, params):
+        expected = "SELECT %s FROM (%s) source" % (COLUMNS, sql)
+        actual = "SELECT %s FROM %s WHERE type = %%s" % (COLUMNS, table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                DRIFT_SQL % {"expected": expected, "actual": actual},
+                params + [type_name, type_name] + params,
+            )
+            missing, orphaned = cursor.fetchone()
+        if missing or orphaned:
+            raise CommandError(
+                "%s: %d rows missing or stale, %d orphaned or stale"
+                % (type_name, missing, orphaned)
+            )
+        self.stdout.write("%s: OK" % type_name)
+
+    def verify_rollups(self, table):
+        expected = ROLLUP_SQL % {"timeline": table}
+        actual = "SELECT year, month, type, count FROM %s WHERE count > 0" % (
+            MonthlyRollup._meta.db_table
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(DRIFT_SQL % {"expected": expected, "actual": actual})
+            missing, orphaned = cursor.fetchone()
+        if missing or orphaned:
+            raise CommandError(
+                "monthly rollups: %d buckets missing or stale, %d orphaned or stale"
+                % (missing, orphaned)
+            )
+        self.stdout.write("monthly rollups: OK")
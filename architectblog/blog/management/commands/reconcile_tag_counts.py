@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from architectblog.blog.models import Tag
+
+
+class Command(BaseCommand):
+    help = "Recount the stored per-type usage counts on every Tag"
+
+    def handle(self, *args, **options):
+        drifted = Tag.objects.reconcile()
+        self.stdout.write("%d tag%s repaired" % (drifted, "" if drifted == 1 else "s"))
@@ -0,0 +1,194 @@
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+
+from architectblog.blog.models import CONTENT_MODELS
+from architectblog.blog.search import update_search_documents
+
+
+def reindex_range(type_name, start, end, after, batch_size, progress):
+    """
+    Reindexes objects with start <= pk <= end (and pk > after, when resuming)
+    in batches ordered by pk, calling progress(type_name, start, last_pk, n)
+    once each batch has been committed.
+    """
+    model = CONTENT_MODELS[type_name]
+    while True:
+        qs = model.objects.filter(pk__gte=start, pk__lte=end)
+        if after is not None:
+            qs = qs.filter(pk__gt=after)
+        batch = list(
+            qs.defer("search_document")
+            .prefetch_related("tags")
+            .order_by("pk")[:batch_size]
+        )
+        if not batch:
+            break
+        update_search_documents(model, batch)
+        after = batch[-1].pk
+        progress(type_name, start, after, len(batch))
+
+
+def worker(type_name, start, end, after, batch_size, progress_queue):
+    try:
+        reindex_range(
+            type_name,
+            start,
+            end,
+            after,
+            batch_size,
+            lambda *args: progress_queue.put(args),
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild search_document for every Entry, Blogmark and Quotation in "
+        "batches, optionally across several worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "types",
+            nargs="*",
+            help="Content types to reindex: entry, blogmark and/or quotation "
+            "(default: all of them)",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes, each handling its own pk range",
+        )
+        parser.add_argument(
+            "--state-file",
+            default="reindex_search.json",
+            help="Where progress is recorded after every batch",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Carry on from the last completed batch in --state-file",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1 or options["workers"] < 1:
+            raise CommandError("--batch-size and --workers must be positive")
+        types = options["types"] or list(CONTENT_MODELS)
+        for type_name in types:
+            if type_name not in CONTENT_MODELS:
+                raise CommandError("Unknown content type: %s" % type_name)
+        self.verbosity = options["verbosity"]
+        self.state_file = options["state_file"]
+        self.state = {}
+        if options["resume"] and os.path.exists(self.state_file):
+            with open(self.state_file) as fp:
+                self.state = json.load(fp)
+
+        for type_name in types:
+            if type_name not in self.state:
+                self.state[type_name] = self.split_ranges(
+                    CONTENT_MODELS[type_name], options["workers"]
+                )
+        self.save_state()
+
+        for type_name in types:
+            self.reindex_type(type_name, options["batch_size"], options["workers"])
+
+        os.remove(self.state_file)
+
+    def split_ranges(self, model, workers):
+        bounds = model.objects.aggregate(start=Min("pk"), end=Max("pk"))
+        if bounds["start"] is None:
+            return []
+        size = (bounds["end"] - bounds["start"]) // workers + 1
+        return [
+            {
+                "start": bounds["start"] + i * size,
+                "end": min(bounds["start"] + (i + 1) * size - 1, bounds["end"]),
+                "done": None,
+            }
+            for i in range(workers)
+            if bounds["start"] + i * size <= bounds["end"]
+        ]
+
+    def save_state(self):
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as fp:
+            json.dump(self.state, fp)
+        os.replace(tmp, self.state_file)
+
+    def reindex_type(self, type_name, batch_size, workers):
+        ranges = self.state[type_name]
+        self.started = time.monotonic()
+        self.reindexed = 0
+
+        if workers == 1:
+            for r in ranges:
+                reindex_range(
+                    type_name,
+                    r["start"],
+                    r["end"],
+                    r["done"],
+                    batch_size,
+                    self.progress,
+                )
+        else:
+            # Children must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            progress_queue = context.Queue()
+            processes = [
+                context.Process(
+                    target=worker,
+                    args=(
+                        type_name,
+                        r["start"],
+                        r["end"],
+                        r["done"],
+                        batch_size,
+                        progress_queue,
+                    ),
+                )
+                for r in ranges
+            ]
+            for process in processes:
+                process.start()
+            while any(p.is_alive() for p in processes) or not progress_queue.empty():
+                try:
+                    self.progress(*progress_queue.get(timeout=0.5))
+                except queue.Empty:
+                    pass
+            if any(p.exitcode for p in processes):
+                raise CommandError(
+                    "A worker failed; rerun with --resume to carry on from the "
+                    "last completed batch"
+                )
+
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            "%s: %d rows in %.1fs (%.0f rows/s)"
+            % (type_name, self.reindexed, elapsed, self.reindexed / (elapsed or 1))
+        )
+
+    def progress(self, type_name, start, last_pk, n):
+        for r in self.state[type_name]:
+            if r["start"] == start:
+                r["done"] = last_pk
+        self.save_state()
+        self.reindexed += n
+        if self.verbosity > 1:
+            elapsed = time.monotonic() - self.started
+            self.stdout.write(
+                "%s: %d rows (%.0f rows/s)"
+                % (type_name, self.reindexed, self.reindexed / (elapsed or 1))
+            )
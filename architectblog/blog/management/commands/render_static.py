@@ -0,0 +1,273 @@
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from architectblog.blog.caching import STATIC_BUILD_KEY
+from architectblog.blog.models import (
+    CONTENT_MODELS,
+    Tag,
+    TimelineItem,
+    date_url_kwargs,
+)
+from architectblog.blog.sitemaps import URLS, published, shard_of
+
+MANIFEST = ".render_static.json"
+BATCH_SIZE = 50
+
+FEED_URLS = {
+    "entry": "blog:entry_feed",
+    "blogmark": "blog:link_feed",
+    "quotation": "blog:quote_feed",
+}
+
+
+def output_path(url, content_type):
+    """Where a page is written, relative to the output directory"""
+    path = url.lstrip("/")
+    if not path or path.endswith("/"):
+        path += "index.xml" if "xml" in content_type else "index.html"
+    return path
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(content)
+    os.replace(temp, path)
+
+
+def remove_files(path):
+    for name in (path, path + ".gz"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def render_pages(urls, output_dir, host, secure):
+    """
+    Renders each URL through the full request handler and writes it, with
+    its compressed siblings, under output_dir. Returns a list of
+    (url, status, path) tuples, path being None for anything but a 200.
+    A page whose view raises is reported as a 500 rather than ending the run.
+    """
+    client = Client(
+        raise_request_exception=False, HTTP_HOST=host, **{STATIC_BUILD_KEY: True}
+    )
+    results = []
+    for url in urls:
+        response = client.get(url, secure=secure)
+        if response.status_code != 200:
+            results.append((url, response.status_code, None))
+            continue
+        content = (
+            b"".join(response.streaming_content)
+            if response.streaming
+            else response.content
+        )
+        path = output_path(url, response["Content-Type"])
+        full_path = os.path.join(output_dir, path)
+        write_file(full_path, content)
+        write_file(full_path + ".gz", gzip.compress(content, 9, mtime=0))
+        results.append((url, 200, path))
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Render every public page to a directory tree for a web server to "
+        "serve directly. Only pages whose content changed since the last run "
+        "are rendered again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output_dir")
+        parser.add_argument(
+            "--base-url",
+            required=True,
+            help="Scheme and host the site is served from, e.g. https://example.com",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of rendering processes",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Render every page, even those that look unchanged",
+        )
+
+    def handle(self, *args, **options):
+        base_url = urlsplit(options["base_url"])
+        if base_url.scheme not in ("http", "https") or not base_url.netloc:
+            raise CommandError("--base-url must look like https://example.com")
+        output_dir = options["output_dir"]
+        os.makedirs(output_dir, exist_ok=True)
+
+        manifest_path = os.path.join(output_dir, MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path) and not options["full"]:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+
+        fingerprints = self.page_fingerprints()
+        stale = [
+            url
+            for url, fingerprint in fingerprints.items()
+            if manifest.get(url, {}).get("fingerprint") != fingerprint
+        ]
+        removed = [url for url in manifest if url not in fingerprints]
+        self.stdout.write(
+            "%d pages, %d to render, %d to remove"
+            % (len(fingerprints), len(stale), len(removed))
+        )
+
+        for url in removed:
+            if manifest[url]["path"]:
+                remove_files(os.path.join(output_dir, manifest[url]["path"]))
+            del manifest[url]
+
+        args = (output_dir, base_url.netloc, base_url.scheme == "https")
+        # Small enough batches that every process gets a share of the work
+        size = max(1, min(BATCH_SIZE, len(stale) // (options["processes"] * 4)))
+        batches = [stale[i : i + size] for i in range(0, len(stale), size)]
+        if options["processes"] <= 1:
+            results = [render_pages(batch, *args) for batch in batches]
+        else:
+            # Children must not share the parent's database connection
+            connections.close_all()
+            with concurrent.futures.ProcessPoolExecutor(
+                options["processes"], mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                results = executor.map(
+                    render_pages, batches, *[[arg] * len(batches) for arg in args]
+                )
+
+        failed = 0
+        for batch in results:
+            for url, status, path in batch:
+                if status == 200:
+                    manifest[url] = {"fingerprint": fingerprints[url], "path": path}
+                else:
+                    failed += 1
+                    self.stderr.write("%s: %d" % (url, status))
+
+        write_file(manifest_path, json.dumps(manifest, indent=1).encode())
+        self.stdout.write(
+            "%d pages rendered, %d failed" % (len(stale) - failed, failed)
+        )
+
+    def page_fingerprints(self):
+        """
+        {url: fingerprint} for every public page. A page's fingerprint is a
+        digest of the (type, pk, updated_time) of every item it can show, and
+        of the name and usage count of each of those items' tags, so it
+        changes whenever one of those is edited, retagged, added or removed,
+        or a tag it shows is renamed or used by some other item.
+        """
+        updated = {}
+        detail_urls = {}
+        for type_name, model in CONTENT_MODELS.items():
+            url_name, date_field = URLS[type_name]
+            published_pks = set(published(type_name).values_list("pk", flat=True))
+            rows = model.objects.values_list("pk", "slug", date_field, "updated_time")
+            for pk, slug, date, updated_time in rows.iterator():
+                updated[(type_name, pk)] = updated_time.isoformat()
+                if pk in published_pks:
+                    detail_urls[(type_name, pk)] = reverse(
+                        url_name,
+                        kwargs={"slug": slug, **date_url_kwargs(date)},
+                    )
+
+        # The items each listing draws from, grouped the way the listings are
+        scopes = {}
+        tag_names = {}
+        tag_states = {}
+        for pk, tag, *counts in Tag.objects.values_list(
+            "pk", "tag", *Tag.COUNT_FIELDS
+        ).iterator():
+            tag_names[pk] = tag
+            tag_states[pk] = "%s=%d" % (tag, sum(counts))
+        rows = TimelineItem.objects.order_by().values_list(
+            "type", "object_id", "year", "month", "day", "tag_ids"
+        )
+        for type_name, pk, year, month, day, tag_ids in rows.iterator():
+            # Pages show each item's tags with their counts
+            if (type_name, pk) in updated:
+                updated[(type_name, pk)] += "".join(
+                    " " + tag_states[tag_id]
+                    for tag_id in tag_ids
+                    if tag_id in tag_names
+                )
+            for scope in [
+                ("all",),
+                ("type", type_name),
+                ("year", year),
+                ("month", year, month),
+                ("day", year, month, day),
+            ] + [("tag", tag_id) for tag_id in tag_ids if tag_id in tag_names]:
+                scopes.setdefault(scope, []).append((type_name, pk))
+        for type_name, pk in detail_urls:
+            scopes[("item", type_name, pk)] = [(type_name, pk)]
+            scopes.setdefault(("shard", type_name, shard_of(pk)), []).append(
+                (type_name, pk)
+            )
+
+        pages = {}
+        for scope, keys in scopes.items():
+            digest = hashlib.md5()
+            for key in sorted(keys):
+                digest.update(("%s:%s:%s\n" % (*key, updated.get(key))).encode())
+            for url in self.scope_urls(scope, tag_names, detail_urls):
+                pages[url] = digest.hexdigest()
+        return pages
+
+    def scope_urls(self, scope, tag_names, detail_urls):
+        """The pages that list exactly the items in a scope"""
+        kind, args = scope[0], scope[1:]
+        if kind == "all":
+            return [
+                reverse(name)
+                for name in (
+                    "blog:home",
+                    "blog:archive_view",
+                    "blog:feed",
+                    "blog:sitemap",
+                )
+            ]
+        if kind == "type":
+            return [reverse(FEED_URLS[args[0]])]
+        if kind == "year":
+            return [reverse("blog:entry_archive_year", args=args)]
+        if kind == "month":
+            # Linked as /2021/03/ from the archive, but fetched as
+            # /archive/2021/3/ by its script
+            return [
+                reverse("blog:entry_archive_month", args=[args[0], "%02d" % args[1]]),
+                reverse("blog:archive_month_items", args=args),
+            ]
+        if kind == "day":
+            return [
+                reverse(
+                    "blog:entry_archive_day", args=[args[0], "%02d" % args[1], args[2]]
+                )
+            ]
+        if kind == "tag":
+            tag = tag_names[args[0]]
+            return [
+                reverse("blog:tag_detail", args=[tag]),
+                reverse("blog:tag_feed", args=[tag]),
+            ]
+        if kind == "item":
+            return [detail_urls[args]]
+        return [reverse("blog:sitemap_shard", args=args)]
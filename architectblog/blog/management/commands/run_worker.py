@@ -0,0 +1,91 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from architectblog.blog import tasks
+from architectblog.blog.models import Job
+
+
+def worker(batch_size, poll_interval, burst):
+    try:
+        tasks.work(batch_size, poll_interval, burst)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (search indexing and the like) from the Job table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=1,
+            help="Number of worker processes to run",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Jobs claimed by a worker at a time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before polling an empty queue again",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for more jobs",
+        )
+        parser.add_argument(
+            "--backlog",
+            action="store_true",
+            help="Print the number of queued and failed jobs, then exit",
+        )
+
+    def handle(self, *args, **options):
+        self.report_backlog()
+        if options["backlog"]:
+            return
+
+        args = (options["batch_size"], options["poll_interval"], options["burst"])
+        if options["processes"] == 1:
+            worker(*args)
+        else:
+            # Children must not share the parent's database connection
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            processes = [
+                context.Process(target=worker, args=args)
+                for _ in range(options["processes"])
+            ]
+            for process in processes:
+                process.start()
+            try:
+                for process in processes:
+                    process.join()
+            except KeyboardInterrupt:
+                for process in processes:
+                    process.join()
+        self.report_backlog()
+
+    def report_backlog(self):
+        for row in Job.objects.backlog():
+            self.stdout.write(
+                "%s: %d queued, oldest %ds ago"
+                % (
+                    row["task"],
+                    row["count"],
+                    (timezone.now() - row["oldest"]).total_seconds(),
+                )
+            )
+        failed = Job.objects.filter(status=Job.FAILED).count()
+        if failed:
+            self.stdout.write(self.style.WARNING("%d failed jobs" % failed))
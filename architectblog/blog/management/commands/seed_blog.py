@@ -0,0 +1,53 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from architectblog.blog.seeding import seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with generated entries, blogmarks, quotations, "
+        "tags and series, for trying the site out at scale. Running it again "
+        "adds more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=2000)
+        parser.add_argument("--blogmarks", type=int, default=6000)
+        parser.add_argument("--quotations", type=int, default=1500)
+        parser.add_argument("--tags", type=int, default=400)
+        parser.add_argument("--series", type=int, default=20)
+        parser.add_argument(
+            "--years", type=int, default=10, help="How far back items go"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Random seed, for repeatable data"
+        )
+        parser.add_argument(
+            "--no-search-index",
+            action="store_true",
+            help="Skip building search documents, which is the slowest part",
+        )
+
+    def handle(self, *args, **options):
+        counts = [
+            options[name]
+            for name in ("entries", "blogmarks", "quotations", "tags", "series")
+        ]
+        if min(counts) < 0 or options["years"] < 1:
+            raise CommandError("Counts must not be negative and --years positive")
+        created = seed(
+            entries=options["entries"],
+            blogmarks=options["blogmarks"],
+            quotations=options["quotations"],
+            tags=options["tags"],
+            series=options["series"],
+            years=options["years"],
+            random_seed=options["seed"],
+            index_search=not options["no_search_index"],
+        )
+        # The rows were bulk inserted, so no signal retired the cached pages
+        cache.clear()
+        self.stdout.write(
+            ", ".join("%d %s" % (n, name) for name, n in sorted(created.items()))
+        )
@@ -0,0 +1,120 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:27
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+POPULATE_SQL = """
+    INSERT INTO blog_timelineitem
+        (type, object_id, created_time, status, year, month, day, tag_ids)
+    SELECT type, object_id, created_time, status,
+        EXTRACT(YEAR FROM created_time AT TIME ZONE %(tz)s)::integer,
+        EXTRACT(MONTH FROM created_time AT TIME ZONE %(tz)s)::integer,
+        EXTRACT(DAY FROM created_time AT TIME ZONE %(tz)s)::integer,
+        tag_ids
+    FROM (
+        SELECT 'entry' AS type, c.id AS object_id, c.created_time, c.status,
+            ARRAY(
+                SELECT t.tag_id FROM blog_entry_tags t
+                WHERE t.entry_id = c.id ORDER BY t.tag_id
+            ) AS tag_ids
+        FROM blog_entry c
+        UNION ALL
+        SELECT 'blogmark', c.id, c.created_time, 'p',
+            ARRAY(
+                SELECT t.tag_id FROM blog_blogmark_tags t
+                WHERE t.blogmark_id = c.id ORDER BY t.tag_id
+            )
+        FROM blog_blogmark c
+        UNION ALL
+        SELECT 'quotation', c.id, c.created_time, 'p',
+            ARRAY(
+                SELECT t.tag_id FROM blog_quotation_tags t
+                WHERE t.quotation_id = c.id ORDER BY t.tag_id
+            )
+        FROM blog_quotation c
+    ) source
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineItem",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("entry", "entry"),
+                            ("blogmark", "blogmark"),
+                            ("quotation", "quotation"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("object_id", models.BigIntegerField()),
+                ("created_time", models.DateTimeField()),
+                ("status", models.CharField(default="p", max_length=1)),
+                ("year", models.PositiveSmallIntegerField()),
+                ("month", models.PositiveSmallIntegerField()),
+                ("day", models.PositiveSmallIntegerField()),
+                (
+                    "tag_ids",
+                    django.contrib.postgres.fields.ArrayField(
+                        base_field=models.BigIntegerField(),
+                        blank=True,
+                        default=list,
+                        size=None,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-created_time", "-type", "-object_id"),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="timelineitem",
+            index=models.Index(
+                fields=["-created_time", "-type", "-object_id"],
+                name="blog_timeline_created",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timelineitem",
+            index=models.Index(
+                fields=["year", "month", "day", "created_time"],
+                name="blog_timeline_date",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timelineitem",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["tag_ids"], name="blog_timeline_tag_ids"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="timelineitem",
+            constraint=models.UniqueConstraint(
+                fields=("type", "object_id"), name="blog_timelineitem_object"
+            ),
+        ),
+        migrations.RunSQL(
+            [(POPULATE_SQL, {"tz": settings.TIME_ZONE})], migrations.RunSQL.noop
+        ),
+    ]
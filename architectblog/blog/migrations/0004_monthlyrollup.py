@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+POPULATE_SQL = """
+    INSERT INTO blog_monthlyrollup (year, month, type, count)
+    SELECT year, month, type, COUNT(*) FROM blog_timelineitem
+        GROUP BY year, month, type
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0003_timelineitem"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                ("month", models.PositiveSmallIntegerField()),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("entry", "entry"),
+                            ("blogmark", "blogmark"),
+                            ("quotation", "quotation"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "ordering": ("year", "month", "type"),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="monthlyrollup",
+            constraint=models.UniqueConstraint(
+                fields=("year", "month", "type"), name="blog_monthlyrollup_bucket"
+            ),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
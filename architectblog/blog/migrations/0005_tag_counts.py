@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+POPULATE_SQL = """
+    UPDATE blog_tag SET
+        entry_count = (
+            SELECT COUNT(*) FROM blog_entry_tags WHERE tag_id = blog_tag.id
+        ),
+        blogmark_count = (
+            SELECT COUNT(*) FROM blog_blogmark_tags WHERE tag_id = blog_tag.id
+        ),
+        quotation_count = (
+            SELECT COUNT(*) FROM blog_quotation_tags WHERE tag_id = blog_tag.id
+        )
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_monthlyrollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="blogmark_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="entry_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tag",
+            name="quotation_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
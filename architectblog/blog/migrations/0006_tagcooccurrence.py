@@ -0,0 +1,74 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+POPULATE_SQL = """
+    WITH tagged AS (
+        SELECT 'entry' AS type, entry_id AS item_id, tag_id FROM blog_entry_tags
+        UNION ALL
+        SELECT 'blogmark', blogmark_id, tag_id FROM blog_blogmark_tags
+        UNION ALL
+        SELECT 'quotation', quotation_id, tag_id FROM blog_quotation_tags
+    )
+    INSERT INTO blog_tagcooccurrence (tag_a_id, tag_b_id, weight)
+    SELECT a.tag_id, b.tag_id, COUNT(*) FROM tagged a
+        JOIN tagged b ON a.type = b.type AND a.item_id = b.item_id
+            AND a.tag_id <> b.tag_id
+    GROUP BY a.tag_id, b.tag_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0005_tag_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagCooccurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("weight", models.PositiveIntegerField(default=0)),
+                (
+                    "tag_a",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="blog.tag",
+                    ),
+                ),
+                (
+                    "tag_b",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="blog.tag",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-weight",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="tagcooccurrence",
+            index=models.Index(fields=["tag_a", "-weight"], name="blog_tagcooc_weight"),
+        ),
+        migrations.AddConstraint(
+            model_name="tagcooccurrence",
+            constraint=models.UniqueConstraint(
+                fields=("tag_a", "tag_b"), name="blog_tagcooccurrence_pair"
+            ),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:43
+
+from django.db import migrations, models
+
+# Existing rows have not been edited since they were created, as far as
+# anyone knows
+POPULATE_SQL = """
+    UPDATE blog_entry SET updated_time = created_time;
+    UPDATE blog_blogmark SET updated_time = created_time;
+    UPDATE blog_quotation SET updated_time = created_time;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0007_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="blogmark",
+            name="updated_time",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last modified"),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="updated_time",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last modified"),
+        ),
+        migrations.AddField(
+            model_name="quotation",
+            name="updated_time",
+            field=models.DateTimeField(auto_now=True, verbose_name="Last modified"),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
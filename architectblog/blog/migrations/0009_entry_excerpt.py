@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:45
+
+from django.db import migrations, models
+
+from architectblog.blog.excerpts import summarize
+
+BATCH_SIZE = 200
+
+
+def populate_excerpts(apps, schema_editor):
+    Entry = apps.get_model("blog", "Entry")
+    fields = ["excerpt_html", "word_count", "reading_minutes"]
+    last_pk = 0
+    while True:
+        batch = list(
+            Entry.objects.filter(pk__gt=last_pk)
+            .only("pk", "content")
+            .order_by("pk")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        for entry in batch:
+            entry.excerpt_html, entry.word_count, entry.reading_minutes = summarize(
+                entry.content
+            )
+        Entry.objects.bulk_update(batch, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0008_updated_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="excerpt_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="reading_minutes",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="entry",
+            name="word_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_excerpts, migrations.RunPython.noop),
+    ]
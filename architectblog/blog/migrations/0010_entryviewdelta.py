@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_entry_excerpt"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EntryViewDelta",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("views", models.PositiveIntegerField()),
+                (
+                    "entry",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="blog.entry",
+                    ),
+                ),
+            ],
+        ),
+    ]
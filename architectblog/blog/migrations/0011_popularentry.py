@@ -0,0 +1,69 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Existing view counts can only seed the all-time leaderboard: when those views
+# happened isn't known
+SEED_SQL = """
+    INSERT INTO blog_popularentry (entry_id, period, score)
+    SELECT id, 'all', LN(views) FROM blog_entry WHERE views > 0
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0010_entryviewdelta"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PopularEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[
+                            ("day", "today"),
+                            ("week", "this week"),
+                            ("all", "all time"),
+                        ],
+                        max_length=4,
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "entry",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="blog.entry",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("-score",),
+            },
+        ),
+        migrations.AddIndex(
+            model_name="popularentry",
+            index=models.Index(fields=["period", "-score"], name="blog_popular_score"),
+        ),
+        migrations.AddConstraint(
+            model_name="popularentry",
+            constraint=models.UniqueConstraint(
+                fields=("entry", "period"), name="blog_popularentry_period"
+            ),
+        ),
+        migrations.RunSQL(SEED_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:02
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0011_popularentry"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="entry",
+            options={"ordering": ("-created_time",), "verbose_name_plural": "entries"},
+        ),
+        migrations.AddIndex(
+            model_name="blogmark",
+            index=models.Index(
+                fields=["slug", "created_time"], name="blog_blogmark_slug_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_document"], name="blog_entry_search_gin"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(
+                fields=["slug", "pub_time"], name="blog_entry_slug_date"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(fields=["created_time"], name="blog_entry_created"),
+        ),
+        migrations.AddIndex(
+            model_name="quotation",
+            index=models.Index(
+                fields=["slug", "created_time"], name="blog_quotation_slug_date"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0012_date_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="merge_key",
+            field=models.CharField(blank=True, max_length=255, null=True, unique=True),
+        ),
+    ]
@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, connection, transaction
 from django.utils.timezone import now
 from django.contrib.postgres.search import SearchVectorField
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
 from django.conf import settings
 from django.utils.text import Truncator
 from django.utils.html import strip_tags, escape
@@ -9,18 +11,91 @@ from tinymce.models import HTMLField
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.utils import timezone
+from django.db.models.functions import Coalesce, Greatest
 from collections import Counter
+from .excerpts import summarize
+import datetime
+import json
+import math
 import re
+import time
 
 tag_re = re.compile("^[a-z0-9]+$")
 
 
+def date_url_kwargs(value):
+    """
+    The year, month and day URL arguments for a datetime, taken in the
+    site's timezone as the date-based views expect.
+    """
+    local_time = timezone.localtime(value)
+    return {
+        "year": local_time.year,
+        "month": local_time.strftime("%m"),
+        "day": local_time.day,
+    }
+
+
+class TagManager(models.Manager):
+    def adjust_count(self, type_name, tag_ids, delta):
+        """Atomically adds delta to the stored count for one content type"""
+        field = "%s_count" % type_name
+        return self.filter(pk__in=tag_ids).update(
+            **{field: Greatest(models.F(field) + delta, 0)}
+        )
+
+    def reconcile(self):
+        """
+        Recounts every tag's usage from the m2m tables in one UPDATE. Returns
+        the number of tags whose stored counts had drifted.
+        """
+        expected = {}
+        for type_name, model in CONTENT_MODELS.items():
+            expected["%s_count" % type_name] = Coalesce(
+                models.Subquery(
+                    model.tags.through.objects.filter(tag_id=models.OuterRef("pk"))
+                    .order_by()
+                    .values("tag_id")
+                    .annotate(n=models.Count("*"))
+                    .values("n")
+                ),
+                0,
+            )
+        drifted = (
+            self.annotate(**{"expected_%s" % k: v for k, v in expected.items()})
+            .exclude(**{field: models.F("expected_%s" % field) for field in expected})
+            .count()
+        )
+        if drifted:
+            self.update(**expected)
+        return drifted
+
+
 class Tag(models.Model):
     tag = models.SlugField(unique=True)
+    entry_count = models.PositiveIntegerField(default=0, editable=False)
+    blogmark_count = models.PositiveIntegerField(default=0, editable=False)
+    quotation_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TagManager()
+
+    # Kept current by TagManager.adjust_count(), never by saving an instance
+    COUNT_FIELDS = ("entry_count", "blogmark_count", "quotation_count")
 
     def __str__(self):
         return self.tag
 
+    def save(self, *args, **kwargs):
+        # An instance loaded before its tag was applied would otherwise write
+        # its stale counts back over the adjusted ones
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNT_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("blog:tag_detail", args=[self.tag])
 
@@ -33,17 +108,14 @@ class Tag(models.Model):
     def get_reltag(self):
         return self.get_link(reltag=True)
 
-    def entry_count(self):
-        return self.entry_set.count()
-
     def link_count(self):
-        return self.blogmark_set.count()
+        return self.blogmark_count
 
     def quote_count(self):
-        return self.quotation_set.count()
+        return self.quotation_count
 
     def total_count(self):
-        return self.entry_count() + self.link_count() + self.quote_count()
+        return self.entry_count + self.blogmark_count + self.quotation_count
 
     def all_types_queryset(self):
         entries = (
@@ -64,29 +136,145 @@ class Tag(models.Model):
         return entries.union(blogmarks, quotations).order_by("-created")
 
     def get_related_tags(self, limit=10):
-        """Get all items tagged with this, look at /their/ tags, order by count"""
+        """Tags that most often appear on the same items as this one"""
         if not hasattr(self, "_related_tags"):
-            counts = Counter()
-            for klass, collection in (
-                (Entry, "entry_set"),
-                (Blogmark, "blogmark_set"),
-                (Quotation, "quotation_set"),
-            ):
-                qs = klass.objects.filter(
-                    pk__in=getattr(self, collection).all()
-                ).values_list("tags__tag", flat=True)
-                counts.update(t for t in qs if t != self.tag)
-            tag_names = [p[0] for p in counts.most_common(limit)]
-            tags_by_name = {t.tag: t for t in Tag.objects.filter(tag__in=tag_names)}
-            # Need a list in the correct order
-            self._related_tags = [tags_by_name[name] for name in tag_names]
+            self._related_tags = [
+                pair.tag_b
+                for pair in TagCooccurrence.objects.filter(
+                    tag_a=self, weight__gt=0
+                ).select_related("tag_b")[:limit]
+            ]
         return self._related_tags
 
 
+class TagCooccurrenceManager(models.Manager):
+    def adjust(self, tag_sets, delta):
+        """
+        tag_sets is an iterable of (all_tags, changed_tags) pairs, one for each
+        item whose tags are changing: all_tags is the item's full set of tag
+        ids including the ones being added or removed, and changed_tags is
+        the subset being added (delta=1) or removed (delta=-1).
+        """
+        deltas = Counter()
+        for all_tags, changed_tags in tag_sets:
+            for tag_a in all_tags:
+                for tag_b in all_tags:
+                    if tag_a != tag_b and (
+                        tag_a in changed_tags or tag_b in changed_tags
+                    ):
+                        deltas[(tag_a, tag_b)] += 1
+        if not deltas:
+            return
+        table = self.model._meta.db_table
+        values = ", ".join(["(%s, %s, %s)"] * len(deltas))
+        params = [
+            value for (tag_a, tag_b), n in deltas.items() for value in (tag_a, tag_b, n)
+        ]
+        with connection.cursor() as cursor:
+            if delta > 0:
+                cursor.execute(
+                    """
+                    INSERT INTO %s (tag_a_id, tag_b_id, weight) VALUES %s
+                    ON CONFLICT (tag_a_id, tag_b_id)
+                        DO UPDATE SET weight = %s.weight + EXCLUDED.weight
+                    """ % (table, values, table),
+                    params,
+                )
+            else:
+                cursor.execute(
+                    """
+                    UPDATE %s SET weight = GREATEST(weight - v.n, 0)
+                    FROM (VALUES %s) AS v (tag_a_id, tag_b_id, n)
+                    WHERE %s.tag_a_id = v.tag_a_id AND %s.tag_b_id = v.tag_b_id
+                    """ % (table, values, table, table),
+                    params,
+                )
+                # Only the pairs just decremented can have dropped to zero
+                cursor.execute(
+                    """
+                    DELETE FROM %s USING (VALUES %s) AS v (tag_a_id, tag_b_id, n)
+                    WHERE %s.tag_a_id = v.tag_a_id AND %s.tag_b_id = v.tag_b_id
+                        AND %s.weight <= 0
+                    """ % (table, values, table, table, table),
+                    params,
+                )
+
+    def rebuild(self):
+        """Recomputes every pair from the m2m tables"""
+        tagged = " UNION ALL ".join(
+            "SELECT '%s' AS type, %s_id AS item_id, tag_id FROM %s"
+            % (type_name, type_name, model.tags.through._meta.db_table)
+            for type_name, model in CONTENT_MODELS.items()
+        )
+        table = self.model._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s" % table)
+            cursor.execute("""
+                WITH tagged AS (%s)
+                INSERT INTO %s (tag_a_id, tag_b_id, weight)
+                SELECT a.tag_id, b.tag_id, COUNT(*) FROM tagged a
+                    JOIN tagged b ON a.type = b.type AND a.item_id = b.item_id
+                        AND a.tag_id <> b.tag_id
+                GROUP BY a.tag_id, b.tag_id
+                """ % (tagged, table))
+            return cursor.rowcount
+
+
+class TagCooccurrence(models.Model):
+    """
+    The number of items carrying both tag_a and tag_b. Every pair is stored in
+    both directions so that related tags are a single index lookup.
+    """
+
+    tag_a = models.ForeignKey(Tag, related_name="+", on_delete=models.CASCADE)
+    tag_b = models.ForeignKey(Tag, related_name="+", on_delete=models.CASCADE)
+    weight = models.PositiveIntegerField(default=0)
+
+    objects = TagCooccurrenceManager()
+
+    class Meta:
+        ordering = ("-weight",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tag_a", "tag_b"], name="blog_tagcooccurrence_pair"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["tag_a", "-weight"], name="blog_tagcooc_weight"),
+        ]
+
+    def __str__(self):
+        return "%s + %s: %d" % (self.tag_a_id, self.tag_b_id, self.weight)
+
+
+class ContentQuerySet(models.QuerySet):
+    """
+    Projections of Entry, Blogmark and Quotation rows. Each model names the
+    columns its listings and its detail page leave out in LISTING_DEFERRED
+    and DETAIL_DEFERRED, and the relations both show in DISPLAY_RELATED.
+    """
+
+    def for_listing(self, *fields):
+        """
+        Rows as shown in lists, without the columns only a detail page or
+        search needs. fields names any of those the caller wants after all.
+        """
+        return self.select_related(*self.model.DISPLAY_RELATED).defer(
+            *[field for field in self.model.LISTING_DEFERRED if field not in fields]
+        )
+
+    def for_detail(self):
+        """Rows as shown on their own page"""
+        return self.select_related(*self.model.DISPLAY_RELATED).defer(
+            *self.model.DETAIL_DEFERRED
+        )
+
+
 class BaseModel(models.Model):
     created_time = models.DateTimeField(
         verbose_name="Creation time", default=timezone.now
     )
+    updated_time = models.DateTimeField(verbose_name="Last modified", auto_now=True)
     tags = models.ManyToManyField(Tag, blank=True)
     slug = models.SlugField(max_length=64)
     latitude = models.FloatField(blank=True, null=True)
@@ -94,6 +282,13 @@ class BaseModel(models.Model):
     metadata = models.JSONField(blank=True, default=dict)
     search_document = SearchVectorField(null=True)
 
+    # No page shows the search document or the metadata
+    LISTING_DEFERRED = ("search_document", "metadata")
+    DETAIL_DEFERRED = ("search_document", "metadata")
+    DISPLAY_RELATED = ()
+
+    objects = ContentQuerySet.as_manager()
+
     @property
     def type(self):
         return self._meta.model_name
@@ -104,7 +299,14 @@ class BaseModel(models.Model):
     class Meta:
         abstract = True
         ordering = ("-created_time",)
-        indexes = [GinIndex(fields=["search_document"])]
+        indexes = [
+            GinIndex(fields=["search_document"]),
+            # Detail pages look items up by slug and date
+            models.Index(
+                fields=["slug", "created_time"],
+                name="%(app_label)s_%(class)s_slug_date",
+            ),
+        ]
 
 
 class Series(models.Model):
@@ -130,6 +332,10 @@ class Entry(BaseModel):
         ("d", "draft"),
         ("p", "published"),
     )
+    EXCERPT_FIELDS = ("excerpt_html", "word_count", "reading_minutes")
+    # Listings show the excerpt; the byline everywhere names the author
+    LISTING_DEFERRED = BaseModel.LISTING_DEFERRED + ("content",)
+    DISPLAY_RELATED = ("author",)
 
     title = models.CharField("title", max_length=300, unique=True)
     content = HTMLField()
@@ -140,6 +346,9 @@ class Entry(BaseModel):
         "status", max_length=1, choices=STATUS_CHOICES, default="p"
     )
     views = models.PositiveIntegerField("views", default=0)
+    excerpt_html = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_minutes = models.PositiveSmallIntegerField(default=0, editable=False)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         verbose_name="author",
@@ -161,23 +370,37 @@ class Entry(BaseModel):
     def get_absolute_url(self):
         return reverse(
             "blog:entry_detail",
-            kwargs={
-                "slug": self.slug,
-                "year": self.pub_time.year,
-                "month": self.pub_time.strftime("%m"),
-                "day": self.pub_time.day,
-            },
+            kwargs={"slug": self.slug, **date_url_kwargs(self.pub_time)},
         )
 
     def index_components(self):
         return {
             "A": self.title,
             "C": strip_tags(self.content),
-            "B": " ".join(self.tags.values_list("tag", flat=True)),
+            "B": " ".join(tag.tag for tag in self.tags.all()),
         }
 
-    class Meta:
+    def update_excerpt(self):
+        """Recomputes excerpt_html, word_count and reading_minutes from content"""
+        self.excerpt_html, self.word_count, self.reading_minutes = summarize(
+            self.content
+        )
+
+    def save(self, *args, **kwargs):
+        self.update_excerpt()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "content" in update_fields:
+            kwargs["update_fields"] = set(update_fields) | set(self.EXCERPT_FIELDS)
+        super().save(*args, **kwargs)
+
+    class Meta(BaseModel.Meta):
         verbose_name_plural = "entries"
+        indexes = [
+            GinIndex(fields=["search_document"], name="blog_entry_search_gin"),
+            models.Index(fields=["slug", "pub_time"], name="blog_entry_slug_date"),
+            # The date-based archive views filter entries on created_time
+            models.Index(fields=["created_time"], name="blog_entry_created"),
+        ]
 
 
 class Blogmark(BaseModel):
@@ -192,7 +415,7 @@ class Blogmark(BaseModel):
     def index_components(self):
         return {
             "A": self.link_title,
-            "B": " ".join(self.tags.values_list("tag", flat=True)),
+            "B": " ".join(tag.tag for tag in self.tags.all()),
             "C": self.commentary
             + " "
             + self.link_domain()
@@ -216,12 +439,7 @@ class Blogmark(BaseModel):
     def get_absolute_url(self):
         return reverse(
             "blog:link_detail",
-            kwargs={
-                "slug": self.slug,
-                "year": self.created_time.year,
-                "month": self.created_time.strftime("%m"),
-                "day": self.created_time.day,
-            },
+            kwargs={"slug": self.slug, **date_url_kwargs(self.created_time)},
         )
 
 
@@ -235,7 +453,7 @@ class Quotation(BaseModel):
     def index_components(self):
         return {
             "A": self.quotation,
-            "B": " ".join(self.tags.values_list("tag", flat=True)),
+            "B": " ".join(tag.tag for tag in self.tags.all()),
             "C": self.source,
         }
 
@@ -245,39 +463,541 @@ class Quotation(BaseModel):
     def get_absolute_url(self):
         return reverse(
             "blog:quote_detail",
-            kwargs={
-                "slug": self.slug,
-                "year": self.created_time.year,
-                "month": self.created_time.strftime("%m"),
-                "day": self.created_time.day,
+            kwargs={"slug": self.slug, **date_url_kwargs(self.created_time)},
+        )
+
+
+CONTENT_MODELS = {
+    "entry": Entry,
+    "blogmark": Blogmark,
+    "quotation": Quotation,
+}
+
+
+class TimelineItemManager(models.Manager):
+    def sync(self, instance):
+        """
+        Creates or updates the timeline row for an Entry/Blogmark/Quotation.
+        Returns the row's previous created_time, status, year, month and day
+        as a dict, or None if there was no row.
+        """
+        local_time = timezone.localtime(
+            instance.created_time, timezone.get_default_timezone()
+        )
+        fields = {
+            "created_time": instance.created_time,
+            "status": getattr(instance, "status", "p"),
+            "year": local_time.year,
+            "month": local_time.month,
+            "day": local_time.day,
+        }
+        lookup = {"type": instance.type, "object_id": instance.pk}
+        previous = (
+            self.filter(**lookup)
+            .values("created_time", "status", "year", "month", "day")
+            .first()
+        )
+        if previous:
+            self.filter(**lookup).update(**fields)
+        else:
+            self.create(**lookup, **fields)
+        buckets = {(local_time.year, local_time.month)}
+        if previous:
+            buckets.add((previous["year"], previous["month"]))
+        for year, month in buckets:
+            MonthlyRollup.objects.refresh(year, month, instance.type)
+        return previous
+
+    def remove(self, instance):
+        previous = (
+            self.filter(type=instance.type, object_id=instance.pk)
+            .values_list("year", "month")
+            .first()
+        )
+        if previous:
+            self.filter(type=instance.type, object_id=instance.pk).delete()
+            MonthlyRollup.objects.refresh(*previous, instance.type)
+
+    def refresh_tags(self, type_name, object_ids=(), tag_id=None):
+        """
+        Recomputes tag_ids from the m2m table for the given objects, plus any
+        object currently listed as carrying tag_id (so that removing or
+        clearing a tag from the Tag side is picked up too).
+        """
+        through = CONTENT_MODELS[type_name].tags.through
+        column = "%s_id" % type_name
+        condition = models.Q(object_id__in=list(object_ids))
+        if tag_id is not None:
+            condition |= models.Q(tag_ids__contains=[tag_id])
+        # Django drops ORDER BY from subqueries, so the ids are sorted by
+        # the aggregate instead
+        self.filter(condition, type=type_name).update(
+            tag_ids=Coalesce(
+                models.Subquery(
+                    through.objects.filter(**{column: models.OuterRef("object_id")})
+                    .values(column)
+                    .annotate(ids=ArrayAgg("tag_id", ordering="tag_id"))
+                    .values("ids")
+                ),
+                models.Value([]),
+                output_field=ArrayField(models.BigIntegerField()),
+            )
+        )
+
+    def source_sql(self, type_name):
+        """
+        SQL selecting what the timeline rows for one content type should be,
+        computed straight from the content and m2m tables.
+        """
+        model = CONTENT_MODELS[type_name]
+        through = model.tags.through
+        return (
+            """
+            SELECT %%s AS type, c.id AS object_id, c.created_time,
+                %(status)s AS status,
+                EXTRACT(YEAR FROM c.created_time AT TIME ZONE %%s)::integer AS year,
+                EXTRACT(MONTH FROM c.created_time AT TIME ZONE %%s)::integer AS month,
+                EXTRACT(DAY FROM c.created_time AT TIME ZONE %%s)::integer AS day,
+                ARRAY(
+                    SELECT t.tag_id FROM %(through)s t
+                    WHERE t.%(column)s = c.id ORDER BY t.tag_id
+                ) AS tag_ids
+            FROM %(table)s c
+        """
+            % {
+                "status": "c.status" if type_name == "entry" else "'p'",
+                "through": through._meta.db_table,
+                "column": "%s_id" % type_name,
+                "table": model._meta.db_table,
             },
+            [type_name] + [settings.TIME_ZONE] * 3,
         )
 
 
-def load_mixed_objects(dicts):
+class TimelineItem(models.Model):
     """
-    Takes a list of dictionaries, each of which must at least have a 'type'
-    and a 'pk' key. Returns a list of ORM objects of those various types.
-    Each returned ORM object has a .original_dict attribute populated.
+    One row per Entry, Blogmark and Quotation, so that listings which mix
+    the three types can be served by a single indexed query.
     """
-    to_fetch = {}
-    for d in dicts:
-        to_fetch.setdefault(d["type"], set()).add(d["pk"])
-    fetched = {}
-    for key, model in (
-        ("blogmark", Blogmark),
-        ("entry", Entry),
-        ("quotation", Quotation),
-    ):
-        ids = to_fetch.get(key) or []
-        objects = model.objects.prefetch_related("tags").filter(pk__in=ids)
-        for obj in objects:
-            fetched[(key, obj.pk)] = obj
-    # Build list in same order as dicts argument
-    to_return = []
-    for d in dicts:
-        item = fetched.get((d["type"], d["pk"])) or None
-        if item:
-            item.original_dict = d
-        to_return.append(item)
-    return to_return
+
+    TYPE_CHOICES = (
+        ("entry", "entry"),
+        ("blogmark", "blogmark"),
+        ("quotation", "quotation"),
+    )
+
+    type = models.CharField(max_length=16, choices=TYPE_CHOICES)
+    object_id = models.BigIntegerField()
+    created_time = models.DateTimeField()
+    status = models.CharField(max_length=1, default="p")
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    day = models.PositiveSmallIntegerField()
+    tag_ids = ArrayField(models.BigIntegerField(), blank=True, default=list)
+
+    objects = TimelineItemManager()
+
+    class Meta:
+        ordering = ("-created_time", "-type", "-object_id")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["type", "object_id"], name="blog_timelineitem_object"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["-created_time", "-type", "-object_id"],
+                name="blog_timeline_created",
+            ),
+            models.Index(
+                fields=["year", "month", "day", "created_time"],
+                name="blog_timeline_date",
+            ),
+            GinIndex(fields=["tag_ids"], name="blog_timeline_tag_ids"),
+        ]
+
+    def __str__(self):
+        return "%s %s" % (self.type, self.object_id)
+
+    def as_dict(self):
+        """The row shape expected by MixedObjectLoader.load()"""
+        return {
+            "type": self.type,
+            "pk": self.object_id,
+            "created_time": self.created_time,
+        }
+
+
+class MonthlyRollupManager(models.Manager):
+    def refresh(self, year, month, type_name):
+        """Recounts one (year, month, type) bucket from the timeline"""
+        timeline = TimelineItem._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO %s (year, month, type, count)
+                SELECT %%s, %%s, %%s, COUNT(*) FROM %s
+                    WHERE year = %%s AND month = %%s AND type = %%s
+                ON CONFLICT (year, month, type)
+                    DO UPDATE SET count = EXCLUDED.count
+                """ % (self.model._meta.db_table, timeline),
+                [year, month, type_name] * 2,
+            )
+
+    def rebuild(self):
+        timeline = TimelineItem._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM %s" % self.model._meta.db_table)
+            cursor.execute("""
+                INSERT INTO %s (year, month, type, count)
+                SELECT year, month, type, COUNT(*) FROM %s
+                    GROUP BY year, month, type
+                """ % (self.model._meta.db_table, timeline))
+
+    def calendar(self, year=None):
+        """
+        Returns a list of {"year", "months", "total"} dicts, newest year first.
+        months holds a {"date", "counts", "total"} dict for each month that has
+        any content, where counts maps type to count.
+        """
+        rollups = self.filter(count__gt=0)
+        if year is not None:
+            rollups = rollups.filter(year=year)
+        years = {}
+        for rollup in rollups.order_by("-year", "month"):
+            month = years.setdefault(rollup.year, {}).setdefault(
+                rollup.month,
+                {"date": datetime.date(rollup.year, rollup.month, 1), "counts": {}},
+            )
+            month["counts"][rollup.type] = rollup.count
+        calendar = []
+        for year, months in years.items():
+            for month in months.values():
+                month["total"] = sum(month["counts"].values())
+            calendar.append(
+                {
+                    "year": year,
+                    "months": list(months.values()),
+                    "total": sum(month["total"] for month in months.values()),
+                }
+            )
+        return calendar
+
+    def for_year(self, year):
+        calendar = self.calendar(year)
+        return calendar[0]["months"] if calendar else []
+
+
+class MonthlyRollup(models.Model):
+    """Number of items of each type per (local) calendar month"""
+
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    type = models.CharField(max_length=16, choices=TimelineItem.TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    objects = MonthlyRollupManager()
+
+    class Meta:
+        ordering = ("year", "month", "type")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["year", "month", "type"], name="blog_monthlyrollup_bucket"
+            )
+        ]
+
+    def __str__(self):
+        return "%d-%02d %s: %d" % (self.year, self.month, self.type, self.count)
+
+
+class JobManager(models.Manager):
+    def claim(self, limit, lease):
+        """
+        Takes up to `limit` runnable jobs, oldest first, skipping any another
+        worker has locked. Claimed jobs have run_after pushed `lease` into the
+        future, so a worker that dies part way through loses them only until
+        the lease runs out.
+        """
+        with transaction.atomic():
+            jobs = list(
+                self.select_for_update(skip_locked=True)
+                .filter(status=Job.QUEUED, run_after__lte=now())
+                .order_by("run_after", "id")[:limit]
+            )
+            if jobs:
+                self.filter(pk__in=[job.pk for job in jobs]).update(
+                    run_after=now() + lease, attempts=models.F("attempts") + 1
+                )
+        for job in jobs:
+            job.attempts += 1
+        return jobs
+
+    def merge(self, task, payload, field, values):
+        """
+        Adds values to the list payload[field] of the one job per transaction
+        with this task and payload, creating the job if there isn't one yet.
+        The job is written in the current transaction, so it exists exactly
+        when the changes that called for it commit.
+        """
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO %s
+                    (task, payload, status, attempts, run_after, created_time,
+                    last_error, merge_key)
+                VALUES (%%s, %%s, %%s, 0, %%s, %%s, '',
+                    txid_current() || ':' || %%s || ':' || %%s)
+                ON CONFLICT (merge_key) DO UPDATE SET payload = jsonb_set(
+                    %s.payload,
+                    ARRAY[%%s],
+                    (
+                        SELECT jsonb_agg(DISTINCT value ORDER BY value)
+                        FROM jsonb_array_elements(
+                            (%s.payload -> %%s) || (EXCLUDED.payload -> %%s)
+                        )
+                    )
+                )
+                """ % (table, table, table),
+                [
+                    task,
+                    json.dumps({**payload, field: sorted(set(values))}),
+                    self.model.QUEUED,
+                    timezone.now(),
+                    timezone.now(),
+                    task,
+                    json.dumps(payload, sort_keys=True),
+                    field,
+                    field,
+                    field,
+                ],
+            )
+
+    def backlog(self):
+        """Queued job count and age of the oldest queued job, per task"""
+        return list(
+            self.filter(status=Job.QUEUED)
+            .values("task")
+            .annotate(count=models.Count("id"), oldest=models.Min("created_time"))
+            .order_by("task")
+        )
+
+
+class Job(models.Model):
+    """A unit of background work, picked up by the run_worker command"""
+
+    QUEUED = "queued"
+    FAILED = "failed"
+    STATUS_CHOICES = ((QUEUED, "Queued"), (FAILED, "Failed"))
+
+    task = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_time = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Identifies the job JobManager.merge() adds to within one transaction
+    merge_key = models.CharField(max_length=255, blank=True, null=True, unique=True)
+
+    objects = JobManager()
+
+    class Meta:
+        ordering = ("run_after", "id")
+        indexes = [
+            models.Index(
+                fields=["run_after", "id"],
+                name="blog_job_runnable",
+                condition=models.Q(status="queued"),
+            )
+        ]
+
+    def __str__(self):
+        return "%s #%s" % (self.task, self.pk)
+
+
+class EntryViewDeltaManager(models.Manager):
+    def record(self, counts):
+        """Appends {entry_id: views} to the table in one INSERT"""
+        self.bulk_create(
+            EntryViewDelta(entry_id=entry_id, views=views)
+            for entry_id, views in counts.items()
+        )
+
+    def flush(self, at=None):
+        """
+        Consumes every recorded delta, adds the totals to Entry.views and
+        folds them into the PopularEntry scores, all in a single statement.
+        Returns the number of entries updated.
+        """
+        at = time.time() if at is None else at
+        rates = PopularEntry.decay_rates()
+        params = [at] + [value for period_rate in rates for value in period_rate]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                WITH consumed AS (
+                    DELETE FROM %(deltas)s RETURNING entry_id, views
+                ), totals AS (
+                    SELECT entry_id, SUM(views) AS views FROM consumed
+                    GROUP BY entry_id
+                ), scored AS (
+                    INSERT INTO %(scores)s AS s (entry_id, period, score)
+                    SELECT totals.entry_id, periods.period,
+                        LN(totals.views::double precision) + %%s * periods.rate
+                    FROM totals
+                        JOIN %(entries)s ON %(entries)s.id = totals.entry_id
+                        CROSS JOIN (VALUES %(periods)s) AS periods (period, rate)
+                    ON CONFLICT (entry_id, period) DO UPDATE SET score =
+                        GREATEST(s.score, EXCLUDED.score) + LN(1 + EXP(
+                            -LEAST(ABS(s.score - EXCLUDED.score), 50)
+                        ))
+                )
+                UPDATE %(entries)s SET views = %(entries)s.views + totals.views
+                FROM totals WHERE %(entries)s.id = totals.entry_id
+                """
+                % {
+                    "deltas": self.model._meta.db_table,
+                    "scores": PopularEntry._meta.db_table,
+                    "entries": Entry._meta.db_table,
+                    "periods": ", ".join(["(%s, %s::double precision)"] * len(rates)),
+                },
+                params,
+            )
+            return cursor.rowcount
+
+
+class EntryViewDelta(models.Model):
+    """
+    Page views not yet added to Entry.views. Web processes only ever insert
+    here, so counting never waits on a lock held on a popular entry's row.
+    """
+
+    entry = models.ForeignKey(
+        Entry,
+        related_name="+",
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    views = models.PositiveIntegerField()
+
+    objects = EntryViewDeltaManager()
+
+
+class PopularEntryManager(models.Manager):
+    def top(self, period, limit=10):
+        """The highest scoring published entries for one period"""
+        return (
+            self.filter(period=period, entry__status="p")
+            .select_related("entry")
+            .defer(*["entry__%s" % field for field in Entry.LISTING_DEFERRED])[:limit]
+        )
+
+
+class PopularEntry(models.Model):
+    """
+    A time-decayed view score for each entry over each period, kept current
+    by EntryViewDelta.objects.flush() so the leaderboard is one index scan.
+
+    Rather than decaying every score as time passes, each view is weighted
+    up by 2 ** (t / half_life), t being seconds since the epoch; the order
+    comes out the same and a row only changes when its entry is viewed.
+    Those weights grow without bound, so score holds the natural log of the
+    total. All-time views don't decay, making its score log(views).
+    """
+
+    DAY = "day"
+    WEEK = "week"
+    ALL_TIME = "all"
+    PERIOD_CHOICES = (
+        (DAY, "today"),
+        (WEEK, "this week"),
+        (ALL_TIME, "all time"),
+    )
+    HALF_LIVES = {DAY: 60 * 60 * 24, WEEK: 60 * 60 * 24 * 7, ALL_TIME: None}
+
+    entry = models.ForeignKey(Entry, related_name="+", on_delete=models.CASCADE)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    score = models.FloatField()
+
+    objects = PopularEntryManager()
+
+    class Meta:
+        ordering = ("-score",)
+        constraints = [
+            models.UniqueConstraint(
+                fields=["entry", "period"], name="blog_popularentry_period"
+            )
+        ]
+        indexes = [
+            models.Index(fields=["period", "-score"], name="blog_popular_score"),
+        ]
+
+    def __str__(self):
+        return "%s (%s): %.2f" % (self.entry_id, self.period, self.score)
+
+    @classmethod
+    def decay_rates(cls):
+        """[(period, rate)] where a view's log weight is t * rate"""
+        return [
+            (period, math.log(2) / half_life if half_life else 0.0)
+            for period, half_life in cls.HALF_LIVES.items()
+        ]
+
+
+class MixedObjectLoader:
+    """
+    Loads the Entry, Blogmark and Quotation objects named by a list of
+    dictionaries, each of which must at least have a 'type' and a 'pk' key,
+    with one query per type, projected by for_listing(). Every object loaded
+    is kept, so an item shown in more than one part of a page is fetched
+    once; for_request() gives each request its own loader. hits and misses
+    count the items found already loaded and the items that had to be
+    queried for.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_request(cls, request):
+        if not hasattr(request, "mixed_object_loader"):
+            request.mixed_object_loader = cls()
+        return request.mixed_object_loader
+
+    def load(self, dicts, fields=()):
+        """
+        Returns the ORM objects for dicts, in the same order, with None for
+        any that no longer exist. fields names deferred fields the caller
+        needs; objects already loaded without them are loaded again. Each
+        object's .original_dict is set to the dictionary it was loaded for.
+        """
+        to_fetch = {}
+        for d in dicts:
+            obj = self.objects.get((d["type"], d["pk"]))
+            if obj is None or obj.get_deferred_fields().intersection(fields):
+                to_fetch.setdefault(d["type"], set()).add(d["pk"])
+            else:
+                self.hits += 1
+        for type_name, pks in to_fetch.items():
+            self.misses += len(pks)
+            objects = (
+                CONTENT_MODELS[type_name]
+                .objects.for_listing(*fields)
+                .filter(pk__in=pks)
+                .prefetch_related("tags")
+                # Results come back in the order of dicts anyway
+                .order_by()
+            )
+            for obj in objects:
+                self.objects[(type_name, obj.pk)] = obj
+
+        to_return = []
+        for d in dicts:
+            item = self.objects.get((d["type"], d["pk"]))
+            if item:
+                item.original_dict = d
+            to_return.append(item)
+        return to_return
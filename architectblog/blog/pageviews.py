@@ -0,0 +1,99 @@
+import atexit
+import logging
+import re
+import threading
+from collections import Counter
+
+from django.db import DatabaseError, connection
+
+from .models import EntryViewDelta
+
+logger = logging.getLogger(__name__)
+
+# Pending views are written out once there are this many, or this many
+# seconds after the first of them was counted, whichever comes first
+BUFFER_SIZE = 100
+BUFFER_SECONDS = 10
+
+BOT_RE = re.compile(
+    r"bot|crawl|spider|slurp|archiver|fetch|monitor|preview|scan|headless|"
+    r"curl|wget|python-|go-http|java/|libwww|httpclient|feed",
+    re.IGNORECASE,
+)
+
+
+def is_human(request):
+    """
+    A best guess at whether a request is a person reading the page, rather
+    than a crawler, a link preview or the browser prefetching it.
+    """
+    user_agent = request.META.get("HTTP_USER_AGENT", "")
+    if not user_agent or BOT_RE.search(user_agent):
+        return False
+    purpose = request.META.get("HTTP_SEC_PURPOSE") or request.META.get(
+        "HTTP_PURPOSE", ""
+    )
+    if "prefetch" in purpose:
+        return False
+    # Don't count the author checking their own work
+    return not request.user.is_staff
+
+
+class ViewBuffer:
+    """
+    Per-process tally of entry views, written out in batches. A timer makes
+    sure views are written within BUFFER_SECONDS even if no more arrive.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.timer = None
+
+    def add(self, entry_id):
+        with self.lock:
+            self.counts[entry_id] += 1
+            full = sum(self.counts.values()) >= BUFFER_SIZE
+            self.start_timer()
+        if full:
+            self.spill()
+
+    def start_timer(self):
+        """Schedules a spill, unless one already is. Call with the lock held."""
+        if self.timer is None:
+            self.timer = threading.Timer(BUFFER_SECONDS, self.spill_on_timer)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def spill_on_timer(self):
+        try:
+            self.spill()
+        finally:
+            # The timer's thread has a database connection of its own
+            connection.close()
+
+    def spill(self):
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if not counts:
+            return
+        try:
+            EntryViewDelta.objects.record(counts)
+        except DatabaseError:
+            # Keep the views for next time rather than failing the request
+            logger.exception("Could not record %d views", sum(counts.values()))
+            with self.lock:
+                self.counts.update(counts)
+                self.start_timer()
+
+
+buffer = ViewBuffer()
+atexit.register(buffer.spill)
+
+
+def record_view(request, entry_id):
+    if request.method == "GET" and is_human(request):
+        buffer.add(entry_id)
@@ -0,0 +1,107 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db import models
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(item):
+    """
+    Turns a timeline row (a dict with 'created_time', 'type' and 'pk') into an
+    opaque, URL-safe token.
+    """
+    raw = "%s|%s|%s" % (item["created_time"].isoformat(), item["type"], item["pk"])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    """Reverses encode_cursor(), raising InvalidCursor for garbage input"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_time, type_name, pk = raw.split("|")
+        created_time = parse_datetime(created_time)
+        pk = int(pk)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise InvalidCursor(token)
+    if created_time is None:
+        raise InvalidCursor(token)
+    return {"created_time": created_time, "type": type_name, "pk": pk}
+
+
+def keyset_filter(cursor, older=True):
+    """
+    Returns a Q object selecting TimelineItem rows that sort strictly after
+    (older=True) or before (older=False) the cursor, where the timeline is
+    ordered by (created_time, type, object_id) descending.
+    """
+    created_time = cursor["created_time"]
+    op = "lt" if older else "gt"
+    return (
+        models.Q(**{"created_time__%s" % op: created_time})
+        | models.Q(created_time=created_time, **{"type__%s" % op: cursor["type"]})
+        | models.Q(
+            created_time=created_time,
+            type=cursor["type"],
+            **{"object_id__%s" % op: cursor["pk"]}
+        )
+    )
+
+
+class TimelinePage:
+    """One page of a keyset-paginated, mixed-type timeline"""
+
+    def __init__(self, rows, has_older, has_newer):
+        self.rows = rows
+        self.has_older = has_older
+        self.has_newer = has_newer
+
+    @property
+    def older_cursor(self):
+        if self.has_older and self.rows:
+            return encode_cursor(self.rows[-1])
+        return None
+
+    @property
+    def newer_cursor(self):
+        if self.has_newer and self.rows:
+            return encode_cursor(self.rows[0])
+        return None
+
+
+def paginate_timeline(queryset, per_page, older=None, newer=None):
+    """
+    Fetches one page of TimelineItem rows, as dicts suitable for passing to
+    MixedObjectLoader.load(). Reads at most per_page + 1 rows from the
+    (created_time, type, object_id) index however large the archive gets.
+    """
+    if older and newer:
+        raise InvalidCursor("Only one of older and newer may be given")
+    cursor = decode_cursor(older or newer) if (older or newer) else None
+    going_older = newer is None
+    ordering = ("-created_time", "-type", "-object_id")
+    if not going_older:
+        ordering = ("created_time", "type", "object_id")
+    if cursor is not None:
+        queryset = queryset.filter(keyset_filter(cursor, older=going_older))
+    rows = [item.as_dict() for item in queryset.order_by(*ordering)[: per_page + 1]]
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if going_older:
+        return TimelinePage(rows, has_older=has_more, has_newer=cursor is not None)
+    rows.reverse()
+    return TimelinePage(rows, has_older=True, has_newer=has_more)
+
+
+class CountedPaginator(Paginator):
+    """A Paginator that can be handed a count it already knows"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
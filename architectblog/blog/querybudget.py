@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# The most queries each view may run when nothing it needs is cached. A view
+# going over has usually grown a query per item or per month; fix that, or
+# raise its budget here if the extra queries are deliberate.
+QUERY_BUDGETS = {
+    "blog:home": 8,
+    "blog:entry_detail": 5,
+    "blog:link_detail": 5,
+    "blog:quote_detail": 5,
+    "blog:entry_archive_year": 10,
+    "blog:entry_archive_month": 10,
+    "blog:entry_archive_day": 8,
+    "blog:search": 12,
+    "blog:tag_detail": 10,
+    "blog:tag_feed": 10,
+    "blog:feed": 10,
+    "blog:entry_feed": 5,
+    "blog:link_feed": 5,
+    "blog:quote_feed": 5,
+    "blog:sitemap": 4,
+    "blog:sitemap_shard": 2,
+    "blog:archive_view": 3,
+    "blog:archive_month_items": 8,
+    "blog:popular": 4,
+    "blog:popular_period": 4,
+}
+
+# Lists of placeholders vary in length with the number of values
+PLACEHOLDER_LIST_RE = re.compile(r"%s(?:, %s)+")
+
+
+def fingerprint(sql):
+    """
+    A short digest identifying a query's shape, so the same query repeated
+    with different parameters gets the same fingerprint.
+    """
+    normalized = PLACEHOLDER_LIST_RE.sub("%s, ...", sql)
+    return hashlib.md5(normalized.encode()).hexdigest()[:10]
+
+
+class QueryRecorder:
+    """
+    Counts and times every query run on the default connection while
+    installed with connection.execute_wrapper().
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.examples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.examples.setdefault(key, sql)
+
+    def duplicates(self):
+        """{fingerprint: times run} for every query shape run more than once"""
+        return {key: n for key, n in self.fingerprints.most_common() if n > 1}
+
+
+class QueryBudgetMiddleware:
+    """
+    Records the queries behind each response and reports them, per resolved
+    view name, as X-Query-* headers and a log record, along with how well
+    the request's MixedObjectLoader did at reusing objects. Requests over
+    their budget are logged as warnings, the rest at DEBUG. Enabled by the
+    BLOG_QUERY_STATS setting, which production leaves off.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "BLOG_QUERY_STATS", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = QUERY_BUDGETS.get(view_name)
+        duplicates = recorder.duplicates()
+        # Queries made while a streaming response is sent are not counted
+        response["X-Query-Count"] = recorder.count
+        response["X-Query-Time"] = "%.1f" % (recorder.duration * 1000)
+        if duplicates:
+            response["X-Query-Duplicates"] = ", ".join(
+                "%s*%d" % (key, n) for key, n in duplicates.items()
+            )
+        loader = getattr(request, "mixed_object_loader", None)
+        if loader is not None:
+            response["X-Mixed-Objects"] = "hits=%d misses=%d" % (
+                loader.hits,
+                loader.misses,
+            )
+
+        over_budget = budget is not None and recorder.count > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.DEBUG,
+            "%s %s: %d queries in %.1fms, %d duplicated",
+            view_name,
+            request.path,
+            recorder.count,
+            recorder.duration * 1000,
+            sum(duplicates.values()),
+            extra={
+                "view_name": view_name,
+                "path": request.path,
+                "query_count": recorder.count,
+                "query_time": recorder.duration,
+                "query_budget": budget,
+                "duplicate_queries": {
+                    recorder.examples[key]: n for key, n in duplicates.items()
+                },
+                "mixed_object_hits": loader.hits if loader else None,
+                "mixed_object_misses": loader.misses if loader else None,
+            },
+        )
+        return response
+
+
+class QueryBudgetMixin:
+    """TestCase mixin for holding views to their QUERY_BUDGETS entry"""
+
+    def assertWithinQueryBudget(self, url):
+        """Fetches url with the test client and checks the queries it ran"""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.client.get(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        view_name = response.resolver_match.view_name
+        self.assertIn(view_name, QUERY_BUDGETS, "No query budget for %s" % view_name)
+        self.assertLessEqual(
+            recorder.count,
+            QUERY_BUDGETS[view_name],
+            "%s ran %d queries, over its budget of %d. Repeated:\n%s"
+            % (
+                url,
+                recorder.count,
+                QUERY_BUDGETS[view_name],
+                "\n".join(
+                    "%dx %s" % (n, recorder.examples[key])
+                    for key, n in recorder.duplicates().items()
+                ),
+            ),
+        )
+        return recorder
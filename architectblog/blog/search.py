@@ -0,0 +1,64 @@
+from django.db import connection
+
+from .models import CONTENT_MODELS
+from .tasks import enqueue_merged, task
+
+
+def update_search_documents(model, instances):
+    """
+    Recomputes search_document for a batch of objects of one model with a
+    single UPDATE ... FROM (VALUES ...) statement. Prefetch "tags" on the
+    instances to avoid a query per object in index_components().
+    """
+    rows = [(obj.pk, obj.index_components()) for obj in instances]
+    if not rows:
+        return 0
+    weights = list(rows[0][1])
+    vector = " || ".join(
+        "setweight(to_tsvector(COALESCE(v.w%d, '')), '%s')" % (i, weight)
+        for i, weight in enumerate(weights)
+    )
+    row_sql = "(%s" + ", %s::text" * len(weights) + ")"
+    table = model._meta.db_table
+    sql = """
+        UPDATE %(table)s SET search_document = %(vector)s
+        FROM (VALUES %(values)s) AS v (id, %(columns)s)
+        WHERE %(table)s.id = v.id
+    """ % {
+        "table": table,
+        "vector": vector,
+        "values": ", ".join([row_sql] * len(rows)),
+        "columns": ", ".join("w%d" % i for i in range(len(weights))),
+    }
+    params = []
+    for pk, components in rows:
+        params.append(pk)
+        params.extend(components[weight] for weight in weights)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def schedule_reindex(model, pks):
+    """
+    Queues objects for reindexing, as part of the current transaction.
+    However many times an object is queued, it is indexed once: within a
+    transaction, every call for a model adds to a single reindex_search job.
+    """
+    enqueue_merged("reindex_search", {"type": model._meta.model_name}, "pks", list(pks))
+
+
+@task("reindex_search")
+def reindex_search(payloads):
+    """Payloads are {"type": "entry", "pks": [...]}; duplicates are merged"""
+    pks_by_type = {}
+    for payload in payloads:
+        pks_by_type.setdefault(payload["type"], set()).update(payload["pks"])
+    for type_name, pks in pks_by_type.items():
+        model = CONTENT_MODELS[type_name]
+        update_search_documents(
+            model,
+            model.objects.filter(pk__in=pks)
+            .defer("search_document")
+            .prefetch_related("tags"),
+        )
@@ -0,0 +1,211 @@
+"""
+Generates a realistic-looking blog for query plan tests and benchmarks:
+years of entries, links and quotations, with tag use following a Zipf
+distribution so a few tags are on a large share of items and most are
+rare, as on a real blog.
+"""
+
+import datetime
+import io
+import itertools
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Max
+
+from .models import (
+    Blogmark,
+    Entry,
+    Quotation,
+    Series,
+    Tag,
+    TagCooccurrence,
+)
+from .search import update_search_documents
+
+WORDS = (
+    "architecture building design space light concrete timber glass facade "
+    "plan section detail structure city street house museum library tower "
+    "bridge garden courtyard stair roof window wall column material texture "
+    "drawing model sketch project competition studio office urban landscape "
+    "housing density public private room threshold scale proportion rhythm"
+).split()
+
+END_TIME = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+BATCH_SIZE = 1000
+# Share of entries that are part of a series
+SERIES_RATIO = 0.1
+
+
+def zipf_weights(n, exponent=1.1):
+    return [1 / (rank**exponent) for rank in range(1, n + 1)]
+
+
+# Word frequencies are Zipfian too, so some search terms are rare
+WORD_WEIGHTS = zipf_weights(len(WORDS))
+
+
+def words(rng, count):
+    return " ".join(rng.choices(WORDS, WORD_WEIGHTS, k=count))
+
+
+def html_body(rng):
+    """
+    Paragraphs with the odd heading, list and link. Lengths are log-normal:
+    most bodies are a handful of paragraphs, a few run to a hundred or more.
+    """
+    blocks = []
+    for _ in range(min(int(rng.lognormvariate(1.6, 0.8)) + 1, 200)):
+        roll = rng.random()
+        if roll < 0.1:
+            blocks.append("<h3>%s</h3>" % words(rng, rng.randint(2, 6)).capitalize())
+        elif roll < 0.2:
+            blocks.append(
+                "<ul>%s</ul>"
+                % "".join(
+                    "<li>%s</li>" % words(rng, rng.randint(3, 12))
+                    for _ in range(rng.randint(2, 6))
+                )
+            )
+        else:
+            text = words(rng, rng.randint(20, 120))
+            if rng.random() < 0.3:
+                word = rng.choice(WORDS)
+                text += ' <a href="https://example.com/%s">%s</a>' % (word, word)
+            blocks.append("<p>%s.</p>" % text)
+    return "".join(blocks)
+
+
+def seed(
+    entries=2000,
+    blogmarks=4000,
+    quotations=1000,
+    tags=300,
+    series=20,
+    years=10,
+    tags_per_item=(1, 6),
+    draft_ratio=0.05,
+    random_seed=0,
+    index_search=True,
+):
+    """
+    Bulk-inserts the given number of items, tags and series, then rebuilds
+    everything normally maintained by signals: the timeline and its
+    rollups, tag counts, co-occurrence and search documents. Finishes with
+    ANALYZE so the planner sees the new row counts. Returns the number of
+    rows created per model.
+
+    Names and slugs are numbered on from the rows already there, so a
+    seeded database can be grown by seeding it again.
+    """
+    rng = random.Random(random_seed)
+    author, _ = get_user_model().objects.get_or_create(username="seed")
+
+    first_tag = Tag.objects.count()
+    Tag.objects.bulk_create(
+        [
+            Tag(tag="%s%d" % (rng.choice(WORDS), i))
+            for i in range(first_tag, first_tag + tags)
+        ]
+    )
+    # New tags join the tail of the distribution
+    tag_objects = list(Tag.objects.order_by("pk"))
+    weights = zipf_weights(len(tag_objects))
+    first_series = Series.objects.count()
+    series_objects = Series.objects.bulk_create(
+        [
+            Series(
+                title=words(rng, 3).title(),
+                slug="seeded-series-%d" % i,
+                description=words(rng, 30),
+            )
+            for i in range(first_series, first_series + series)
+        ]
+    )
+    span = years * 365 * 24 * 60 * 60
+
+    def created_time():
+        return END_TIME - datetime.timedelta(seconds=rng.randrange(span))
+
+    def make_entry(i):
+        when = created_time()
+        entry = Entry(
+            title="%s %d" % (words(rng, 4).capitalize(), i),
+            slug="seeded-entry-%d" % i,
+            content=html_body(rng),
+            pub_time=when,
+            created_time=when,
+            status="d" if rng.random() < draft_ratio else "p",
+            author=author,
+        )
+        if series_objects and rng.random() < SERIES_RATIO:
+            entry.series = rng.choice(series_objects)
+        entry.update_excerpt()
+        return entry
+
+    def make_blogmark(i):
+        return Blogmark(
+            link_url="https://example.com/%s/%d" % (rng.choice(WORDS), i),
+            link_title=words(rng, 6).capitalize(),
+            commentary=words(rng, rng.randint(10, 60)),
+            slug="seeded-link-%d" % i,
+            created_time=created_time(),
+        )
+
+    def make_quotation(i):
+        return Quotation(
+            quotation=words(rng, rng.randint(15, 80)).capitalize(),
+            source=words(rng, 2).title(),
+            slug="seeded-quote-%d" % i,
+            created_time=created_time(),
+        )
+
+    created = {"tag": tags, "series": series}
+    # Only the new rows need search documents
+    last_pks = {}
+    for model, count, make in (
+        (Entry, entries, make_entry),
+        (Blogmark, blogmarks, make_blogmark),
+        (Quotation, quotations, make_quotation),
+    ):
+        type_name = model._meta.model_name
+        through = model.tags.through
+        column = "%s_id" % type_name
+        first = model.objects.count()
+        last_pks[model] = model.objects.aggregate(last=Max("pk"))["last"] or 0
+        numbers = iter(range(first, first + count))
+        while True:
+            batch = [make(i) for i in itertools.islice(numbers, BATCH_SIZE)]
+            if not batch:
+                break
+            model.objects.bulk_create(batch)
+            links = []
+            for obj in batch:
+                chosen = set(
+                    rng.choices(tag_objects, weights, k=rng.randint(*tags_per_item))
+                )
+                links.extend(
+                    through(**{column: obj.pk, "tag_id": tag.pk}) for tag in chosen
+                )
+            through.objects.bulk_create(links)
+        created[type_name] = count
+
+    call_command("rebuild_timeline", stdout=io.StringIO())
+    Tag.objects.reconcile()
+    TagCooccurrence.objects.rebuild()
+    if index_search:
+        for model in last_pks:
+            queryset = model.objects.defer("search_document").prefetch_related("tags")
+            last_pk = last_pks[model]
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk).order_by("pk")[:500])
+                if not batch:
+                    break
+                update_search_documents(model, batch)
+                last_pk = batch[-1].pk
+
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    return created
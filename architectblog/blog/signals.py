@@ -1,43 +1,239 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save, m2m_changed
-from django.db.models import Value, TextField
-from django.contrib.postgres.search import SearchVector
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.db import transaction
-from .models import BaseModel, Tag
-import operator
-from functools import reduce
+from django.utils import timezone
+from .caching import (
+    TIMELINE_DEPENDENCY,
+    bump_content_version,
+    date_dependencies,
+    invalidate,
+    item_dependency,
+    tag_dependency,
+)
+from .models import BaseModel, Tag, TagCooccurrence, TimelineItem, CONTENT_MODELS
+from .search import schedule_reindex
+from .sitemaps import shard_dependency, shard_of
 
 
 @receiver(post_save)
 def on_save(sender, **kwargs):
     if not issubclass(sender, BaseModel):
         return
-    transaction.on_commit(make_updater(kwargs["instance"]))
+    instance = kwargs["instance"]
+    previous = TimelineItem.objects.sync(instance)
+    schedule_reindex(sender, [instance.pk])
+
+    dependencies = [
+        item_dependency(instance.type, instance.pk),
+        shard_dependency(instance.type, shard_of(instance.pk)),
+    ]
+    if previous is None or (previous["created_time"], previous["status"]) != (
+        instance.created_time,
+        getattr(instance, "status", "p"),
+    ):
+        # New, or moved in the timeline
+        dependencies.append(TIMELINE_DEPENDENCY)
+        dependencies.extend(date_dependencies(instance.created_time))
+        if previous is not None:
+            dependencies.extend(date_dependencies(previous["created_time"]))
+    invalidate(dependencies)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def on_content_changed(sender, **kwargs):
+    if issubclass(sender, BaseModel) or sender is Tag:
+        transaction.on_commit(bump_content_version)
+
+
+@receiver(pre_delete)
+def on_pre_delete(sender, instance, **kwargs):
+    if issubclass(sender, BaseModel):
+        # The m2m rows are removed by the cascade without an m2m_changed signal
+        Tag.objects.adjust_count(instance.type, instance.tags.values("pk"), -1)
+        tag_ids = set(instance.tags.values_list("pk", flat=True))
+        TagCooccurrence.objects.adjust([(tag_ids, tag_ids)], -1)
+        invalidate(
+            [
+                item_dependency(instance.type, instance.pk),
+                shard_dependency(instance.type, shard_of(instance.pk)),
+                TIMELINE_DEPENDENCY,
+            ]
+            + date_dependencies(instance.created_time)
+            + [tag_dependency(tag_id) for tag_id in tag_ids]
+        )
+
+
+@receiver(post_delete)
+def on_delete(sender, instance, **kwargs):
+    if issubclass(sender, BaseModel):
+        TimelineItem.objects.remove(instance)
+    elif sender is Tag:
+        # The m2m rows are already gone, so this drops the tag from any
+        # timeline row that still lists it
+        for type_name in CONTENT_MODELS:
+            TimelineItem.objects.refresh_tags(type_name, tag_id=instance.pk)
 
 
 @receiver(m2m_changed)
 def on_m2m_changed(sender, **kwargs):
     instance = kwargs["instance"]
     model = kwargs["model"]
+    if kwargs["action"].startswith("post_"):
+        if model is Tag or isinstance(instance, Tag):
+            transaction.on_commit(bump_content_version)
+        if model is Tag:
+            TimelineItem.objects.refresh_tags(instance.type, [instance.pk])
+        elif isinstance(instance, Tag):
+            TimelineItem.objects.refresh_tags(
+                model._meta.model_name, kwargs["pk_set"] or (), tag_id=instance.pk
+            )
+    if model is Tag:
+        if kwargs["action"].startswith("post_"):
+            schedule_reindex(instance.__class__, [instance.pk])
+    elif isinstance(instance, Tag):
+        if kwargs["action"] == "pre_clear":
+            # pk_set is None for a clear, so find out who is losing the tag
+            column = "%s_id" % model._meta.model_name
+            schedule_reindex(
+                model,
+                sender.objects.filter(tag_id=instance.pk).values_list(
+                    column, flat=True
+                ),
+            )
+        elif kwargs["action"] in ("post_add", "post_remove"):
+            schedule_reindex(model, kwargs["pk_set"])
+
+
+@receiver(m2m_changed)
+def update_tag_counts(sender, instance, model, action, pk_set, **kwargs):
+    """
+    Keeps Tag.entry_count/blogmark_count/quotation_count in step with the m2m
+    tables. Additions are counted after the fact, since Django only reports
+    the rows it actually inserted; removals are counted beforehand, against
+    the rows that are really there.
+    """
+    if model is Tag:
+        type_name = instance.type
+        column = "%s_id" % type_name
+        if action == "post_add":
+            Tag.objects.adjust_count(type_name, pk_set, 1)
+        elif action in ("pre_remove", "pre_clear"):
+            existing = sender.objects.filter(**{column: instance.pk})
+            if action == "pre_remove":
+                existing = existing.filter(tag_id__in=pk_set)
+            Tag.objects.adjust_count(type_name, existing.values("tag_id"), -1)
+    elif isinstance(instance, Tag):
+        type_name = model._meta.model_name
+        column = "%s_id" % type_name
+        if action == "post_add":
+            Tag.objects.adjust_count(type_name, [instance.pk], len(pk_set))
+        elif action in ("pre_remove", "pre_clear"):
+            existing = sender.objects.filter(tag_id=instance.pk)
+            if action == "pre_remove":
+                existing = existing.filter(**{"%s__in" % column: pk_set})
+            Tag.objects.adjust_count(type_name, [instance.pk], -existing.count())
+
+
+@receiver(m2m_changed)
+def update_tag_cooccurrence(sender, instance, model, action, pk_set, **kwargs):
+    """
+    Adjusts TagCooccurrence for the items whose tags are changing, looking at
+    each item's full tag set after an addition or before a removal.
+    """
+    if action not in ("post_add", "pre_remove", "pre_clear"):
+        return
+    delta = 1 if action == "post_add" else -1
     if model is Tag:
-        transaction.on_commit(make_updater(instance))
+        column = "%s_id" % instance.type
+        all_tags = set(
+            sender.objects.filter(**{column: instance.pk}).values_list(
+                "tag_id", flat=True
+            )
+        )
+        changed = all_tags if action == "pre_clear" else all_tags & pk_set
+        TagCooccurrence.objects.adjust([(all_tags, changed)], delta)
     elif isinstance(instance, Tag):
-        for obj in model.objects.filter(pk__in=kwargs["pk_set"]):
-            transaction.on_commit(make_updater(obj))
+        column = "%s_id" % model._meta.model_name
+        items = sender.objects.filter(tag_id=instance.pk).values(column)
+        if action != "pre_clear":
+            items = items.filter(**{"%s__in" % column: pk_set})
+        tag_sets = {}
+        for item_id, tag_id in sender.objects.filter(
+            **{"%s__in" % column: items}
+        ).values_list(column, "tag_id"):
+            tag_sets.setdefault(item_id, set()).add(tag_id)
+        TagCooccurrence.objects.adjust(
+            [(tags, {instance.pk}) for tags in tag_sets.values()], delta
+        )
 
 
-def make_updater(instance):
-    components = instance.index_components()
-    pk = instance.pk
+@receiver(m2m_changed)
+def invalidate_tagged_pages(sender, instance, model, action, pk_set, **kwargs):
+    """
+    Retagging changes the pages of the items involved, and the counts and
+    related tags shown for every tag those items carry. It also moves the
+    items' updated_time on, which retires their cached fragments.
+    """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if model is Tag:
+        type_name = instance.type
+        object_ids = [instance.pk]
+        tag_ids = set(pk_set or ())
+    elif isinstance(instance, Tag):
+        type_name = model._meta.model_name
+        if action == "pre_clear":
+            object_ids = list(
+                sender.objects.filter(tag_id=instance.pk).values_list(
+                    "%s_id" % type_name, flat=True
+                )
+            )
+        else:
+            object_ids = list(pk_set)
+        tag_ids = {instance.pk}
+    else:
+        return
+    tag_ids.update(
+        sender.objects.filter(**{"%s_id__in" % type_name: object_ids}).values_list(
+            "tag_id", flat=True
+        )
+    )
+    invalidate(
+        [item_dependency(type_name, pk) for pk in object_ids]
+        + [tag_dependency(tag_id) for tag_id in tag_ids]
+    )
+    touch(CONTENT_MODELS[type_name], object_ids)
+
 
-    def on_commit():
-        search_vectors = []
-        for weight, text in list(components.items()):
-            search_vectors.append(
-                SearchVector(Value(text, output_field=TextField()), weight=weight)
+@receiver(post_save)
+@receiver(pre_delete)
+def invalidate_tag_pages(sender, instance, **kwargs):
+    """
+    Renaming or deleting a tag changes the pages of every item carrying it,
+    and of the tags it is listed as related to.
+    """
+    if sender is not Tag or kwargs.get("created"):
+        return
+    dependencies = [tag_dependency(instance.pk)]
+    for type_name, model in CONTENT_MODELS.items():
+        object_ids = list(
+            model.tags.through.objects.filter(tag_id=instance.pk).values_list(
+                "%s_id" % type_name, flat=True
             )
-        instance.__class__.objects.filter(pk=pk).update(
-            search_document=reduce(operator.add, search_vectors)
         )
+        dependencies.extend(item_dependency(type_name, pk) for pk in object_ids)
+        touch(model, object_ids)
+    dependencies.extend(
+        tag_dependency(tag_id)
+        for tag_id in TagCooccurrence.objects.filter(tag_a=instance).values_list(
+            "tag_b_id", flat=True
+        )
+    )
+    invalidate(dependencies)
+
 
-    return on_commit
+def touch(model, object_ids):
+    """Bumps updated_time without going through save() and its signals"""
+    if object_ids:
+        model.objects.filter(pk__in=object_ids).update(updated_time=timezone.now())
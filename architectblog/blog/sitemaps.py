@@ -0,0 +1,155 @@
+import hashlib
+from xml.sax.saxutils import escape
+
+from django.core.cache import cache
+from django.db import models
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.generic.base import TemplateView, View
+
+from .caching import (
+    TIMELINE_DEPENDENCY,
+    PageCacheMixin,
+    conditional_response,
+    get_dependency_versions,
+    set_validators,
+)
+from .models import CONTENT_MODELS, date_url_kwargs
+
+# The most URLs the sitemaps protocol allows in one file. Items are sharded by
+# primary key, so an item never moves between shards and a shard can be
+# cached until one of its own items changes.
+SHARD_SIZE = 50000
+SHARD_KEY = "blog:sitemap:%s:%s:%d:%d"
+SHARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+STREAM_CHUNK = 1000
+
+# URL name and the date field its year/month/day come from, for each type
+URLS = {
+    "entry": ("blog:entry_detail", "pub_time"),
+    "blogmark": ("blog:link_detail", "created_time"),
+    "quotation": ("blog:quote_detail", "created_time"),
+}
+
+URLSET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+)
+URLSET_FOOTER = "</urlset>\n"
+URL_ELEMENT = "<url><loc>%s</loc><lastmod>%s</lastmod></url>\n"
+
+
+def shard_of(pk):
+    return (pk - 1) // SHARD_SIZE
+
+
+def shard_dependency(type_name, shard):
+    return "sitemap:%s:%d" % (type_name, shard)
+
+
+def published(type_name):
+    objects = CONTENT_MODELS[type_name].objects
+    return objects.filter(status="p") if type_name == "entry" else objects.all()
+
+
+def shard_urls(base_url, type_name, shard):
+    """
+    Yields the sitemap <url> element for every published item in a shard.
+    Rows are read as (slug, date, updated_time) tuples through a server-side
+    cursor, so no model instances are built and memory stays flat.
+    """
+    url_name, date_field = URLS[type_name]
+    rows = (
+        published(type_name)
+        .filter(pk__gt=shard * SHARD_SIZE, pk__lte=(shard + 1) * SHARD_SIZE)
+        .order_by("pk")
+        .values_list("slug", date_field, "updated_time")
+    )
+    for slug, date, updated_time in rows.iterator(chunk_size=STREAM_CHUNK):
+        path = reverse(
+            url_name,
+            kwargs={"slug": slug, **date_url_kwargs(date)},
+        )
+        yield URL_ELEMENT % (
+            escape(base_url + path),
+            updated_time.isoformat(timespec="seconds"),
+        )
+
+
+class SitemapIndexView(PageCacheMixin, TemplateView):
+    """One <sitemap> per non-empty shard, with the newest updated_time in it"""
+
+    template_name = "blog/sitemap_index.xml"
+    content_type = "application/xml"
+
+    def get_context_data(self, **kwargs):
+        shards = []
+        for type_name in URLS:
+            shards.extend(
+                {"type": type_name, "shard": row["shard"], "lastmod": row["lastmod"]}
+                for row in published(type_name)
+                .annotate(
+                    shard=models.ExpressionWrapper(
+                        (models.F("pk") - 1) / SHARD_SIZE,
+                        output_field=models.BigIntegerField(),
+                    )
+                )
+                .values("shard")
+                .annotate(lastmod=models.Max("updated_time"))
+                .order_by("shard")
+            )
+
+        context = super(SitemapIndexView, self).get_context_data(**kwargs)
+        context["shards"] = shards
+        # New items can start a new shard
+        self.depends_on(TIMELINE_DEPENDENCY)
+        self.depends_on(
+            *[shard_dependency(shard["type"], shard["shard"]) for shard in shards]
+        )
+        return context
+
+
+class SitemapShardView(View):
+    """
+    One shard of the sitemap, streamed as it is read from the database and
+    kept in the cache under the shard's current dependency version.
+    """
+
+    def get(self, request, type_name, shard):
+        if type_name not in URLS:
+            raise Http404
+        base_url = request.build_absolute_uri("/")[:-1]
+        dependency = shard_dependency(type_name, shard)
+        versions = get_dependency_versions([dependency])
+        key = SHARD_KEY % (
+            hashlib.md5(base_url.encode()).hexdigest(),
+            type_name,
+            shard,
+            versions[dependency],
+        )
+
+        content = cache.get(key)
+        if content is not None:
+            response = HttpResponse(content, content_type="application/xml")
+        else:
+            response = StreamingHttpResponse(
+                self.stream(key, base_url, type_name, shard),
+                content_type="application/xml",
+            )
+        set_validators(response, versions)
+        return conditional_response(request, response)
+
+    def stream(self, key, base_url, type_name, shard):
+        parts = [URLSET_HEADER]
+        yield URLSET_HEADER
+        chunk = []
+        for element in shard_urls(base_url, type_name, shard):
+            chunk.append(element)
+            if len(chunk) == STREAM_CHUNK:
+                parts.append("".join(chunk))
+                yield parts[-1]
+                chunk = []
+        parts.append("".join(chunk) + URLSET_FOOTER)
+        yield parts[-1]
+        # Only reached if the whole shard was sent
+        cache.set(key, "".join(parts), SHARD_CACHE_TIMEOUT)
@@ -0,0 +1,113 @@
+import datetime
+import logging
+import time
+import traceback
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+LEASE = datetime.timedelta(minutes=5)
+
+TASKS = {}
+
+
+def task(name):
+    """
+    Registers a function as a background task. The function is called with a
+    list of payloads, one per job, so a worker can handle a batch at once.
+    """
+
+    def register(func):
+        TASKS[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, payloads):
+    """
+    Records jobs for the worker. The rows are written in the current
+    transaction, so they are only there if it commits. With
+    BLOG_TASKS_EAGER set the task instead runs in-process once the
+    transaction commits, which is handy where no worker is running.
+    """
+    if name not in TASKS:
+        raise KeyError("Unknown task: %s" % name)
+    payloads = list(payloads)
+    if not payloads:
+        return
+    if getattr(settings, "BLOG_TASKS_EAGER", False):
+        transaction.on_commit(lambda: TASKS[name](payloads))
+    else:
+        Job.objects.bulk_create(Job(task=name, payload=p) for p in payloads)
+
+
+def enqueue_merged(name, payload, field, values):
+    """
+    Like enqueue() for a single payload whose list payload[field] gets the
+    values, except that everything enqueued for the same name and payload
+    within one transaction goes into one job, with duplicate values dropped.
+    """
+    if name not in TASKS:
+        raise KeyError("Unknown task: %s" % name)
+    values = list(values)
+    if not values:
+        return
+    if getattr(settings, "BLOG_TASKS_EAGER", False):
+        transaction.on_commit(lambda: TASKS[name]([{**payload, field: values}]))
+    else:
+        Job.objects.merge(name, payload, field, values)
+
+
+def run_jobs(jobs):
+    """
+    Runs claimed jobs, one batch per task. A batch that succeeds is deleted;
+    one that raises is retried with exponential backoff, up to MAX_ATTEMPTS.
+    """
+    by_task = {}
+    for job in jobs:
+        by_task.setdefault(job.task, []).append(job)
+    for name, batch in by_task.items():
+        try:
+            with transaction.atomic():
+                if name not in TASKS:
+                    raise KeyError("Unknown task: %s" % name)
+                TASKS[name]([job.payload for job in batch])
+        except Exception:
+            logger.exception("%s: %d jobs failed", name, len(batch))
+            error = traceback.format_exc()
+            for job in batch:
+                job.last_error = error
+                if job.attempts >= MAX_ATTEMPTS:
+                    job.status = Job.FAILED
+                else:
+                    job.run_after = timezone.now() + datetime.timedelta(
+                        seconds=30 * 2**job.attempts
+                    )
+            Job.objects.bulk_update(batch, ["status", "run_after", "last_error"])
+        else:
+            Job.objects.filter(pk__in=[job.pk for job in batch]).delete()
+
+
+def work(batch_size=100, poll_interval=1.0, burst=False):
+    """
+    Claims and runs jobs until the queue is empty (burst=True) or forever,
+    sleeping for poll_interval seconds whenever there is nothing to do.
+    Returns the number of jobs run.
+    """
+    done = 0
+    while True:
+        jobs = Job.objects.claim(batch_size, LEASE)
+        if jobs:
+            run_jobs(jobs)
+            done += len(jobs)
+        elif burst:
+            return done
+        else:
+            time.sleep(poll_interval)
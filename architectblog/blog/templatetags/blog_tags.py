@@ -1,18 +1,67 @@
 from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
+from architectblog.blog.caching import (
+    FRAGMENT_CACHE_TIMEOUT,
+    POPULAR_DEPENDENCY,
+    fragment_key,
+)
+from architectblog.blog.models import PopularEntry
 
 register = template.Library()
 
 
+def render_items(items, showdate):
+    """
+    Adds the rendered markup for each item as item["html"], reusing cached
+    copies where there are any: one get_many for the whole list, and one
+    set_many for whatever had to be rendered.
+    """
+    keys = [fragment_key(item["obj"], showdate) for item in items]
+    fragments = cache.get_many(keys)
+    rendered = {}
+    for key, item in zip(keys, items):
+        if key not in fragments:
+            rendered[key] = fragments[key] = render_to_string(
+                "includes/blog_mixed_item.html", {"item": item, "showdate": showdate}
+            )
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_CACHE_TIMEOUT)
+    return [
+        dict(item, html=mark_safe(fragments[key])) for key, item in zip(keys, items)
+    ]
+
+
 @register.inclusion_tag("includes/blog_mixed_list.html", takes_context=True)
 def blog_mixed_list(context, items):
-    context.update({"items": items, "showdate": False})
+    context.update({"items": render_items(items, False), "showdate": False})
     return context
 
 
 @register.inclusion_tag("includes/blog_mixed_list.html", takes_context=True)
 def blog_mixed_list_with_dates(context, items, year_headers=False):
-    context.update({"items": items, "showdate": True, "year_headers": year_headers})
+    context.update(
+        {
+            "items": render_items(items, True),
+            "showdate": True,
+            "year_headers": year_headers,
+        }
+    )
+    return context
+
+
+@register.inclusion_tag("includes/popular_entries.html", takes_context=True)
+def popular_entries(context, period=PopularEntry.WEEK, limit=5):
+    popular = list(PopularEntry.objects.top(period, limit))
+    view = context.get("view")
+    if hasattr(view, "depends_on"):
+        # Cached pages showing the leaderboard go stale when views are flushed,
+        # or when one of the entries on it is edited
+        view.depends_on(POPULAR_DEPENDENCY)
+        view.depends_on_items([row.entry for row in popular])
+    context.update({"popular": popular, "period": period})
     return context
 
 
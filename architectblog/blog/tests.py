@@ -1,3 +1,1543 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+from unittest import mock
+import time
 
-# Create your tests here.
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import utc
+
+from . import pageviews, sitemaps, urls
+from .caching import DEPENDENCY_KEY, TIMELINE_DEPENDENCY
+from .management.commands import render_static
+from .management.commands.benchmark_views import sample_urls
+from .models import (
+    Blogmark,
+    Entry,
+    EntryViewDelta,
+    Job,
+    MixedObjectLoader,
+    MonthlyRollup,
+    PopularEntry,
+    Quotation,
+    Series,
+    Tag,
+    TagCooccurrence,
+    TimelineItem,
+)
+from .pagination import (
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+    paginate_timeline,
+)
+from .querybudget import QUERY_BUDGETS, QueryBudgetMixin
+from .search import update_search_documents
+from .seeding import seed
+from .tasks import LEASE
+from .templatetags import blog_tags
+from .views import IndexListView
+
+# Recorded plan costs, regenerated with BLOG_UPDATE_PLAN_COSTS=1
+PLAN_COSTS_FILE = os.path.join(os.path.dirname(__file__), "query_plan_costs.json")
+# How far a view's total estimated cost may grow before the test fails
+COST_TOLERANCE = 1.5
+# Tables smaller than this may be read in full
+SEQ_SCAN_ROWS = 1000
+# A scan of a larger table may read this many rows, or this share of the
+# table, only to filter them out
+FILTERED_ROWS = 500
+FILTERED_SHARE = 0.25
+
+DECLARE_RE = re.compile(r"^DECLARE .+? CURSOR .*?FOR ", re.IGNORECASE)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+)
+class QueryPlanTests(TestCase):
+    """
+    Runs each public view against a seeded blog and checks the plan of
+    every query it makes. Each query is run under EXPLAIN ANALYZE with
+    sequential scans disabled; a scan of a sizeable table that is still
+    sequential, or that reads many rows only to discard them, has no
+    suitable index. The normal plan's estimated cost, summed over the
+    view's queries, must also stay within COST_TOLERANCE of
+    query_plan_costs.json.
+    """
+
+    # Views whose job is to read every row of these tables
+    allowed_seq_scans = {
+        "sitemap_index": {"blog_entry", "blog_blogmark", "blog_quotation"},
+        # A common search term matches most entries, so the facet counts
+        # visit most of the timeline
+        "search": {"blog_timelineitem"},
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with open(PLAN_COSTS_FILE) as f:
+            cls.plan_costs = json.load(f)
+        # Set here rather than in setUpTestData, which gives each test a copy
+        cls.new_costs = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(entries=3000, blogmarks=6000, quotations=1500, tags=400)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+            )
+            cls.table_rows = dict(cursor.fetchall())
+
+    @classmethod
+    def tearDownClass(cls):
+        if os.environ.get("BLOG_UPDATE_PLAN_COSTS"):
+            with open(PLAN_COSTS_FILE, "w") as f:
+                json.dump(dict(sorted(cls.new_costs.items())), f, indent=4)
+                f.write("\n")
+        super().tearDownClass()
+
+    def explain(self, sql, analyze=False):
+        with connection.cursor() as cursor:
+            if analyze:
+                cursor.execute("SET enable_seqscan = off")
+            try:
+                cursor.execute(
+                    "EXPLAIN (%sFORMAT JSON) %s" % ("ANALYZE, " if analyze else "", sql)
+                )
+                return cursor.fetchone()[0][0]["Plan"]
+            finally:
+                cursor.execute("RESET enable_seqscan")
+
+    def assertGoodPlans(self, name, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        captured = queries.captured_queries
+        if response.streaming:
+            with CaptureQueriesContext(connection) as streamed:
+                b"".join(response.streaming_content)
+            captured += streamed.captured_queries
+
+        allowed = self.allowed_seq_scans.get(name, set())
+        total_cost = 0
+        for query in captured:
+            # Iterated querysets run inside DECLARE ... CURSOR FOR SELECT
+            sql = DECLARE_RE.sub("", query["sql"])
+            if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                continue
+            total_cost += self.explain(sql)["Total Cost"]
+            for node in plan_nodes(self.explain(sql, analyze=True)):
+                table = node.get("Relation Name")
+                if table in allowed or self.table_rows.get(table, 0) < SEQ_SCAN_ROWS:
+                    continue
+                self.assertNotEqual(
+                    node["Node Type"],
+                    "Seq Scan",
+                    "%s: no index for %s in\n%s" % (name, table, sql),
+                )
+                filtered = node.get("Rows Removed by Filter", 0) * node["Actual Loops"]
+                self.assertLess(
+                    filtered,
+                    max(FILTERED_ROWS, self.table_rows[table] * FILTERED_SHARE),
+                    "%s: %s of %s discards %d rows in\n%s"
+                    % (name, node["Node Type"], table, filtered, sql),
+                )
+
+        self.new_costs[name] = round(total_cost, 2)
+        if name in self.plan_costs and not os.environ.get("BLOG_UPDATE_PLAN_COSTS"):
+            self.assertLessEqual(
+                total_cost,
+                self.plan_costs[name] * COST_TOLERANCE,
+                "%s: estimated cost went from %.2f to %.2f"
+                % (name, self.plan_costs[name], total_cost),
+            )
+
+    def test_index(self):
+        self.assertGoodPlans("index", "/")
+
+    def test_entry_detail(self):
+        entry = Entry.objects.filter(status="p").order_by("pk")[100]
+        self.assertGoodPlans("entry_detail", entry.get_absolute_url())
+
+    def test_link_detail(self):
+        link = Blogmark.objects.order_by("pk")[100]
+        self.assertGoodPlans("link_detail", link.get_absolute_url())
+
+    def test_quote_detail(self):
+        quote = Quotation.objects.order_by("pk")[100]
+        self.assertGoodPlans("quote_detail", quote.get_absolute_url())
+
+    def test_year_archive(self):
+        self.assertGoodPlans("year_archive", "/2020/")
+
+    def test_month_archive(self):
+        self.assertGoodPlans("month_archive", "/2020/06/")
+
+    def test_day_archive(self):
+        entry = Entry.objects.filter(created_time__year=2020).order_by("pk")[0]
+        created = entry.created_time
+        self.assertGoodPlans(
+            "day_archive", "/%d/%02d/%d/" % (created.year, created.month, created.day)
+        )
+
+    def test_archive(self):
+        self.assertGoodPlans("archive", "/archive/")
+
+    def test_archive_month_items(self):
+        self.assertGoodPlans("archive_month_items", "/archive/2020/6/")
+
+    def test_popular_tag(self):
+        tag = Tag.objects.order_by("pk")[0]
+        self.assertGoodPlans("popular_tag", tag.get_absolute_url())
+
+    def test_rare_tag(self):
+        tag = Tag.objects.order_by("-pk")[0]
+        self.assertGoodPlans("rare_tag", tag.get_absolute_url())
+
+    def test_tag_intersection(self):
+        first, second = Tag.objects.order_by("pk")[:2]
+        self.assertGoodPlans(
+            "tag_intersection", "/tags/%s+%s/" % (first.tag, second.tag)
+        )
+
+    def test_tag_later_page(self):
+        tag = Tag.objects.order_by("pk")[0]
+        self.assertGoodPlans("tag_later_page", tag.get_absolute_url() + "?page=5")
+
+    def test_search(self):
+        self.assertGoodPlans("search", "/search/?q=threshold+rhythm")
+
+    def test_search_tag(self):
+        tag = Tag.objects.order_by("pk")[3]
+        self.assertGoodPlans("search_tag", "/search/?tag=%s" % tag.tag)
+
+    def test_feed(self):
+        self.assertGoodPlans("feed", "/feed/")
+
+    def test_type_feed(self):
+        self.assertGoodPlans("type_feed", "/feed/quotes/")
+
+    def test_tag_feed(self):
+        tag = Tag.objects.order_by("pk")[10]
+        self.assertGoodPlans("tag_feed", "/tags/%s/feed/" % tag.tag)
+
+    def test_sitemap_index(self):
+        self.assertGoodPlans("sitemap_index", "/sitemap.xml")
+
+    def test_sitemap_shard(self):
+        shard = (Entry.objects.order_by("pk")[0].pk - 1) // 50000
+        self.assertGoodPlans("sitemap_shard", "/sitemap-entry-%d.xml" % shard)
+
+    def test_popular(self):
+        self.assertGoodPlans("popular", "/popular/")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Holds each public view to its entry in QUERY_BUDGETS, with enough items
+    seeded that every listing has a full page.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(entries=300, blogmarks=600, quotations=150, tags=60, years=2)
+
+    def test_every_view_has_a_budget(self):
+        names = {"blog:%s" % pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - set(QUERY_BUDGETS), set())
+
+    def test_index(self):
+        self.assertWithinQueryBudget("/")
+
+    @override_settings(BLOG_QUERY_STATS=True)
+    def test_stats_headers(self):
+        response = self.client.get("/")
+        self.assertGreater(int(response["X-Query-Count"]), 0)
+        self.assertGreaterEqual(float(response["X-Query-Time"]), 0)
+        self.assertNotIn("X-Query-Duplicates", response)
+        self.assertEqual(response["X-Mixed-Objects"], "hits=0 misses=30")
+
+    @override_settings(BLOG_QUERY_STATS=True)
+    def test_only_requests_over_budget_are_warnings(self):
+        with self.assertLogs("architectblog.blog.querybudget", "DEBUG") as logs:
+            self.client.get("/")
+        self.assertEqual([record.levelname for record in logs.records], ["DEBUG"])
+        cache.clear()
+        with mock.patch.dict(QUERY_BUDGETS, {"blog:home": 1}):
+            with self.assertLogs("architectblog.blog.querybudget", "DEBUG") as logs:
+                self.client.get("/")
+        self.assertEqual([record.levelname for record in logs.records], ["WARNING"])
+
+    def test_details(self):
+        entry = Entry.objects.filter(status="p").order_by("pk")[10]
+        self.assertWithinQueryBudget(entry.get_absolute_url())
+        for model in (Blogmark, Quotation):
+            self.assertWithinQueryBudget(
+                model.objects.order_by("pk")[10].get_absolute_url()
+            )
+
+    def test_date_archives(self):
+        entry = Entry.objects.filter(created_time__year=2023).order_by("pk")[0]
+        created = entry.created_time
+        self.assertWithinQueryBudget("/2023/")
+        self.assertWithinQueryBudget("/2023/%02d/" % created.month)
+        self.assertWithinQueryBudget("/2023/%02d/%d/" % (created.month, created.day))
+
+    def test_archive(self):
+        self.assertWithinQueryBudget("/archive/")
+        self.assertWithinQueryBudget("/archive/2023/6/")
+
+    def test_tags(self):
+        first, second = Tag.objects.order_by("pk")[:2]
+        self.assertWithinQueryBudget(first.get_absolute_url())
+        self.assertWithinQueryBudget(first.get_absolute_url() + "?page=2")
+        self.assertWithinQueryBudget("/tags/%s+%s/" % (first.tag, second.tag))
+
+    def test_search(self):
+        tag = Tag.objects.order_by("pk")[0]
+        self.assertWithinQueryBudget("/search/?q=threshold")
+        self.assertWithinQueryBudget("/search/?tag=%s&year=2023" % tag.tag)
+
+    def test_feeds(self):
+        tag = Tag.objects.order_by("pk")[0]
+        for url in ("/feed/", "/feed/entries/", "/feed/links/", "/feed/quotes/"):
+            self.assertWithinQueryBudget(url)
+        self.assertWithinQueryBudget("/tags/%s/feed/" % tag.tag)
+
+    def test_sitemaps(self):
+        shard = (Entry.objects.order_by("pk")[0].pk - 1) // 50000
+        self.assertWithinQueryBudget("/sitemap.xml")
+        self.assertWithinQueryBudget("/sitemap-entry-%d.xml" % shard)
+
+    def test_popular(self):
+        self.assertWithinQueryBudget("/popular/")
+        self.assertWithinQueryBudget("/popular/day/")
+
+
+class SeedingTests(TestCase):
+    def test_seeding_again_adds_more(self):
+        for _ in range(2):
+            call_command(
+                "seed_blog",
+                entries=20,
+                blogmarks=30,
+                quotations=10,
+                tags=8,
+                series=2,
+                stdout=io.StringIO(),
+            )
+        self.assertEqual(Entry.objects.count(), 40)
+        self.assertEqual(Blogmark.objects.count(), 60)
+        self.assertEqual(Quotation.objects.count(), 20)
+        self.assertEqual(Tag.objects.count(), 16)
+        self.assertEqual(Series.objects.count(), 4)
+        self.assertEqual(
+            TimelineItem.objects.count(),
+            Entry.objects.count()
+            + Blogmark.objects.count()
+            + Quotation.objects.count(),
+        )
+
+    def test_benchmark_covers_every_view(self):
+        seed(entries=20, blogmarks=30, quotations=10, tags=8)
+        urls_by_name = sample_urls()
+        self.assertEqual(
+            set(urls_by_name), {pattern.name for pattern in urls.urlpatterns}
+        )
+        for url in urls_by_name.values():
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+
+
+class MixedObjectLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(entries=10, blogmarks=10, quotations=10, tags=5, index_search=False)
+        cls.rows = [item.as_dict() for item in TimelineItem.objects.all()]
+
+    def test_each_object_is_loaded_once(self):
+        loader = MixedObjectLoader()
+        with self.assertNumQueries(6):
+            first = loader.load(self.rows)
+        with self.assertNumQueries(0):
+            second = loader.load(self.rows[:5])
+        self.assertEqual([obj.pk for obj in first], [row["pk"] for row in self.rows])
+        self.assertEqual(second, first[:5])
+        self.assertEqual((loader.hits, loader.misses), (5, 30))
+
+    def test_loads_deferred_fields_when_asked(self):
+        loader = MixedObjectLoader()
+        rows = [row for row in self.rows if row["type"] == "entry"]
+        entry = loader.load(rows)[0]
+        self.assertIn("content", entry.get_deferred_fields())
+        with self.assertNumQueries(2):
+            entry = loader.load(rows, fields=["content"])[0]
+        self.assertNotIn("content", entry.get_deferred_fields())
+        with self.assertNumQueries(0):
+            entry.author
+            list(entry.tags.all())
+
+    def test_missing_objects_are_none(self):
+        Blogmark.objects.filter(pk=self.rows[0]["pk"]).delete()
+        rows = [{"type": "blogmark", "pk": self.rows[0]["pk"]}]
+        self.assertEqual(MixedObjectLoader().load(rows), [None])
+
+
+class ContentQuerySetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(entries=10, blogmarks=10, quotations=10, tags=5, index_search=False)
+
+    def test_for_listing_defers_heavy_columns(self):
+        entry = Entry.objects.for_listing()[0]
+        self.assertEqual(
+            entry.get_deferred_fields(), {"content", "metadata", "search_document"}
+        )
+        with self.assertNumQueries(0):
+            entry.author
+        entry = Entry.objects.for_listing("content")[0]
+        self.assertEqual(entry.get_deferred_fields(), {"metadata", "search_document"})
+        for model in (Blogmark, Quotation):
+            self.assertEqual(
+                model.objects.for_listing()[0].get_deferred_fields(),
+                {"metadata", "search_document"},
+            )
+
+    def test_for_detail_keeps_content(self):
+        entry = Entry.objects.for_detail()[0]
+        self.assertEqual(entry.get_deferred_fields(), {"metadata", "search_document"})
+        with self.assertNumQueries(0):
+            entry.author
+
+    def test_admin_changelists(self):
+        self.client.force_login(
+            get_user_model().objects.create_superuser("admin", "a@example.com", None)
+        )
+        for model in (Entry, Blogmark, Quotation):
+            name = "admin:blog_%s_" % model._meta.model_name
+            response = self.client.get(reverse(name + "changelist"))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.context["cl"].result_list[0].get_deferred_fields(),
+                set(model.LISTING_DEFERRED),
+            )
+            obj = model.objects.order_by("pk")[0]
+            response = self.client.get(reverse(name + "change", args=[obj.pk]))
+            self.assertEqual(response.status_code, 200)
+
+    def test_saving_content_recomputes_the_excerpt(self):
+        entry = Entry.objects.order_by("pk")[0]
+        entry.content = "<p>%s</p><p>end</p>" % " ".join(["word"] * 400)
+        entry.save(update_fields=["content"])
+        entry = Entry.objects.get(pk=entry.pk)
+        self.assertEqual(entry.word_count, 401)
+        self.assertEqual(entry.reading_minutes, 3)
+        self.assertEqual(entry.excerpt_html, "<p>%s …</p>" % " ".join(["word"] * 75))
+        entry.content = "<p>one</p><p>two</p>"
+        entry.save()
+        entry = Entry.objects.get(pk=entry.pk)
+        self.assertEqual(entry.word_count, 2)
+        self.assertEqual(entry.reading_minutes, 1)
+        self.assertEqual(entry.excerpt_html, "<p>one</p><p>two</p>")
+
+
+class TagCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user("author")
+        cls.python, cls.django = [Tag.objects.create(tag=tag) for tag in ("py", "dj")]
+
+    def counts(self, tag):
+        tag.refresh_from_db()
+        return (tag.entry_count, tag.blogmark_count, tag.quotation_count)
+
+    def test_counts_follow_tagging(self):
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/",
+            link_title="Example",
+            commentary="",
+            slug="example",
+        )
+        entry.tags.add(self.python, self.django)
+        blogmark.tags.add(self.python)
+        self.assertEqual(self.counts(self.python), (1, 1, 0))
+        self.assertEqual(self.counts(self.django), (1, 0, 0))
+
+        entry.tags.remove(self.django)
+        self.assertEqual(self.counts(self.django), (0, 0, 0))
+        # From the Tag side of the relation too
+        self.python.blogmark_set.clear()
+        self.assertEqual(self.counts(self.python), (1, 0, 0))
+        entry.delete()
+        self.assertEqual(self.counts(self.python), (0, 0, 0))
+
+    def test_saving_a_stale_instance_keeps_the_counts(self):
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/",
+            link_title="Example",
+            commentary="",
+            slug="example",
+        )
+        tag, _ = Tag.objects.get_or_create(tag="beta")
+        blogmark.tags.add(self.python, tag)
+        tag.tag = "gamma"
+        tag.save()
+        self.assertEqual(self.counts(tag), (0, 1, 0))
+        self.assertEqual(self.client.get("/tags/gamma/").status_code, 200)
+
+        # Tagging from the Tag side leaves the instance just as stale
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        self.python.entry_set.add(entry)
+        self.python.save()
+        self.assertEqual(self.counts(self.python), (1, 1, 0))
+
+    def test_reconcile_fixes_drift(self):
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        entry.tags.add(self.python)
+        self.assertEqual(Tag.objects.reconcile(), 0)
+        Tag.objects.filter(pk=self.python.pk).update(entry_count=7, quotation_count=2)
+        self.assertEqual(Tag.objects.reconcile(), 1)
+        self.assertEqual(self.counts(self.python), (1, 0, 0))
+
+
+class TagCooccurrenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user("author")
+        cls.a, cls.b, cls.c = [Tag.objects.create(tag=tag) for tag in "abc"]
+
+    def weights(self):
+        return {
+            (tag_a, tag_b): weight
+            for tag_a, tag_b, weight in TagCooccurrence.objects.values_list(
+                "tag_a__tag", "tag_b__tag", "weight"
+            )
+        }
+
+    def test_weights_follow_tagging(self):
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/",
+            link_title="Example",
+            commentary="",
+            slug="example",
+        )
+        entry.tags.add(self.a, self.b)
+        blogmark.tags.add(self.a, self.b, self.c)
+        self.assertEqual(
+            self.weights(),
+            {
+                ("a", "b"): 2,
+                ("b", "a"): 2,
+                ("a", "c"): 1,
+                ("c", "a"): 1,
+                ("b", "c"): 1,
+                ("c", "b"): 1,
+            },
+        )
+
+        blogmark.tags.remove(self.c)
+        self.assertEqual(self.weights(), {("a", "b"): 2, ("b", "a"): 2})
+        entry.delete()
+        self.assertEqual(self.weights(), {("a", "b"): 1, ("b", "a"): 1})
+        expected = self.weights()
+        TagCooccurrence.objects.rebuild()
+        self.assertEqual(self.weights(), expected)
+
+    def test_only_adjusted_pairs_are_deleted(self):
+        TagCooccurrence.objects.create(tag_a=self.a, tag_b=self.b, weight=1)
+        TagCooccurrence.objects.create(tag_a=self.b, tag_b=self.c, weight=0)
+        TagCooccurrence.objects.adjust([({self.a.pk, self.b.pk}, {self.a.pk})], -1)
+        self.assertEqual(self.weights(), {("b", "c"): 0})
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+)
+class TimelineSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user("author")
+        cls.a, cls.b = [Tag.objects.create(tag=tag) for tag in "ab"]
+
+    def assertInSync(self):
+        # Compares the maintained rows with the ones rebuilt from scratch
+        call_command("rebuild_timeline", verify=True, stdout=io.StringIO())
+
+    def row(self, obj):
+        return (
+            TimelineItem.objects.filter(type=obj.type, object_id=obj.pk)
+            .values_list("year", "month", "day", "status", "tag_ids")
+            .first()
+        )
+
+    def counts(self):
+        return {
+            (year, month, type_name): count
+            for year, month, type_name, count in MonthlyRollup.objects.filter(
+                count__gt=0
+            ).values_list("year", "month", "type", "count")
+        }
+
+    def test_rows_follow_saves_and_deletes(self):
+        # 03:00 UTC is still the previous evening in Chicago
+        entry = Entry.objects.create(
+            title="Post",
+            slug="post",
+            content="<p>Post</p>",
+            author=self.author,
+            created_time=datetime.datetime(2020, 3, 1, 3, 0, tzinfo=utc),
+        )
+        quotation = Quotation.objects.create(
+            quotation="Quote",
+            source="Someone",
+            slug="quote",
+            created_time=datetime.datetime(2020, 2, 10, 12, 0, tzinfo=utc),
+        )
+        self.assertEqual(self.row(entry), (2020, 2, 29, "p", []))
+        self.assertEqual(
+            self.counts(), {(2020, 2, "entry"): 1, (2020, 2, "quotation"): 1}
+        )
+        self.assertInSync()
+
+        entry.title = "Edited"
+        entry.status = "d"
+        entry.save()
+        self.assertEqual(self.row(entry), (2020, 2, 29, "d", []))
+        self.assertInSync()
+
+        entry.created_time = datetime.datetime(2021, 6, 15, 12, 0, tzinfo=utc)
+        entry.save()
+        self.assertEqual(self.row(entry), (2021, 6, 15, "d", []))
+        self.assertEqual(
+            self.counts(), {(2021, 6, "entry"): 1, (2020, 2, "quotation"): 1}
+        )
+        self.assertInSync()
+
+        entry.delete()
+        quotation.delete()
+        self.assertFalse(TimelineItem.objects.exists())
+        self.assertEqual(self.counts(), {})
+        self.assertEqual(MonthlyRollup.objects.calendar(), [])
+        self.assertInSync()
+
+    def test_rows_follow_retagging(self):
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/",
+            link_title="Example",
+            commentary="",
+            slug="example",
+        )
+        # Added out of order, but listed in order
+        entry.tags.add(self.b)
+        entry.tags.add(self.a)
+        self.a.blogmark_set.add(blogmark)
+        self.assertEqual(self.row(entry)[-1], sorted([self.a.pk, self.b.pk]))
+        self.assertEqual(self.row(blogmark)[-1], [self.a.pk])
+        self.assertInSync()
+
+        entry.tags.remove(self.a)
+        self.assertEqual(self.row(entry)[-1], [self.b.pk])
+        self.a.blogmark_set.clear()
+        self.assertEqual(self.row(blogmark)[-1], [])
+        self.assertInSync()
+
+        self.b.delete()
+        self.assertEqual(self.row(entry)[-1], [])
+        self.assertInSync()
+
+    def test_archives_follow_the_rollups(self):
+        entry = Entry.objects.create(
+            title="Post",
+            slug="post",
+            content="<p>Post</p>",
+            author=self.author,
+            created_time=datetime.datetime(2020, 3, 10, 12, 0, tzinfo=utc),
+        )
+        Quotation.objects.create(
+            quotation="Quote",
+            source="Someone",
+            slug="quote",
+            created_time=datetime.datetime(2020, 3, 20, 12, 0, tzinfo=utc),
+        )
+        years = self.client.get("/archive/").context["years"]
+        self.assertEqual([year["year"] for year in years], [2020])
+        self.assertEqual(years[0]["total"], 2)
+        self.assertEqual(years[0]["months"][0]["counts"], {"entry": 1, "quotation": 1})
+
+        entry.created_time = datetime.datetime(2019, 12, 10, 12, 0, tzinfo=utc)
+        entry.save()
+        years = self.client.get("/archive/").context["years"]
+        self.assertEqual([year["year"] for year in years], [2020, 2019])
+        self.assertEqual(
+            [month["counts"] for year in years for month in year["months"]],
+            [{"quotation": 1}, {"entry": 1}],
+        )
+        response = self.client.get("/2019/")
+        self.assertEqual(
+            [month["date"] for month in response.context["months"]],
+            [datetime.date(2019, 12, 1)],
+        )
+        response = self.client.get("/2020/")
+        self.assertEqual(
+            [month["date"] for month in response.context["months"]],
+            [datetime.date(2020, 3, 1)],
+        )
+
+        entry.delete()
+        years = self.client.get("/archive/").context["years"]
+        self.assertEqual([year["year"] for year in years], [2020])
+
+
+class TimelinePaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(entries=5, blogmarks=5, quotations=5, tags=3, index_search=False)
+        # Ties on created_time are broken by type, then object_id
+        when = TimelineItem.objects.order_by("created_time")[0].created_time
+        Blogmark.objects.filter(pk__in=Blogmark.objects.values("pk")[:2]).update(
+            created_time=when
+        )
+        Quotation.objects.filter(pk=Quotation.objects.first().pk).update(
+            created_time=when
+        )
+        call_command("rebuild_timeline", stdout=io.StringIO())
+        cls.rows = [item.as_dict() for item in TimelineItem.objects.all()]
+
+    def test_cursors_round_trip(self):
+        pages = []
+        cursor = None
+        while True:
+            page = paginate_timeline(TimelineItem.objects.all(), 4, older=cursor)
+            pages.append(page)
+            cursor = page.older_cursor
+            if cursor is None:
+                break
+        self.assertEqual([row for page in pages for row in page.rows], self.rows)
+        self.assertIsNone(pages[0].newer_cursor)
+        # Going back from each page gives the page before it
+        for previous, page in zip(pages, pages[1:]):
+            newer = paginate_timeline(
+                TimelineItem.objects.all(), 4, newer=page.newer_cursor
+            )
+            self.assertEqual(newer.rows, previous.rows)
+        self.assertEqual(decode_cursor(encode_cursor(self.rows[0])), self.rows[0])
+
+    def test_invalid_cursors(self):
+        garbage = [
+            "!!!",
+            "bm90IGEgY3Vyc29y",  # "not a cursor"
+            "eWVzdGVyZGF5fGVudHJ5fDE",  # "yesterday|entry|1"
+        ]
+        for token in garbage:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(token)
+            self.assertEqual(self.client.get("/?older=" + token).status_code, 404)
+        cursor = encode_cursor(self.rows[0])
+        with self.assertRaises(InvalidCursor):
+            paginate_timeline(TimelineItem.objects.all(), 4, older=cursor, newer=cursor)
+
+
+@override_settings(BLOG_TASKS_EAGER=False)
+class ReindexQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user("author")
+        cls.tag = Tag.objects.create(tag="py")
+
+    def reindex_jobs(self):
+        return list(
+            Job.objects.filter(task="reindex_search")
+            .order_by("id")
+            .values_list("payload", flat=True)
+        )
+
+    def test_one_job_per_model_per_transaction(self):
+        entry = Entry.objects.create(
+            title="Post", slug="post", content="<p>Post</p>", author=self.author
+        )
+        entry.title = "Retitled"
+        entry.save()
+        entry.tags.add(self.tag)
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/",
+            link_title="Example",
+            commentary="",
+            slug="example",
+        )
+        # Written straight away, rather than once the transaction commits
+        self.assertEqual(
+            self.reindex_jobs(),
+            [
+                {"type": "entry", "pks": [entry.pk]},
+                {"type": "blogmark", "pks": [blogmark.pk]},
+            ],
+        )
+
+        # Whatever a rolled back savepoint added to the job goes with it
+        try:
+            with transaction.atomic():
+                Entry.objects.create(
+                    title="Gone", slug="gone", content="<p>Gone</p>", author=self.author
+                )
+                raise ValueError
+        except ValueError:
+            pass
+        second = Entry.objects.create(
+            title="Two", slug="two", content="<p>Two</p>", author=self.author
+        )
+        self.assertEqual(
+            self.reindex_jobs()[0], {"type": "entry", "pks": [entry.pk, second.pk]}
+        )
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+)
+class ReindexSearchCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user("author")
+        cls.items = [
+            Entry.objects.create(
+                title="Zebra crossings",
+                slug="zebra",
+                content="<p>Zebra</p>",
+                author=author,
+            ),
+            Blogmark.objects.create(
+                link_url="https://example.com/",
+                link_title="Zebra facts",
+                commentary="",
+                slug="zebra",
+            ),
+            Quotation.objects.create(
+                quotation="Zebras are striped", source="Someone", slug="zebra"
+            ),
+        ]
+        # Saves index on commit, which never comes here
+        for item in cls.items:
+            update_search_documents(type(item), [item])
+
+    def setUp(self):
+        self.state_file = os.path.join(tempfile.mkdtemp(), "reindex_search.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.state_file))
+
+    def found(self):
+        results = self.client.get("/search/?q=zebra").context["results"]
+        return {(result["type"], result["obj"].pk) for result in results}
+
+    def test_restores_cleared_documents(self):
+        everything = {(item.type, item.pk) for item in self.items}
+        self.assertEqual(self.found(), everything)
+        for item in self.items:
+            type(item).objects.update(search_document=None)
+        self.assertEqual(self.found(), set())
+
+        call_command(
+            "reindex_search",
+            batch_size=1,
+            state_file=self.state_file,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(self.found(), everything)
+        for item in self.items:
+            item.refresh_from_db(fields=["search_document"])
+            self.assertIsNotNone(item.search_document)
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_only_the_given_types(self):
+        Entry.objects.update(search_document=None)
+        Quotation.objects.update(search_document=None)
+        call_command(
+            "reindex_search", "entry", state_file=self.state_file, stdout=io.StringIO()
+        )
+        self.assertEqual(
+            self.found(), {("entry", self.items[0].pk), ("blogmark", self.items[1].pk)}
+        )
+
+
+class JobClaimTests(TransactionTestCase):
+    def test_claim_skips_locked_jobs(self):
+        Job.objects.bulk_create(
+            Job(task="reindex_search", payload={"n": n}) for n in range(4)
+        )
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_first_two():
+            # Stands in for another worker part way through claiming
+            try:
+                with transaction.atomic():
+                    list(Job.objects.select_for_update().order_by("id")[:2])
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_first_two)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = Job.objects.claim(10, LEASE)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual([job.payload["n"] for job in claimed], [2, 3])
+        self.assertEqual([job.attempts for job in claimed], [1, 1])
+        # The claimed jobs are leased out, leaving the two that were locked
+        claimed = Job.objects.claim(10, LEASE)
+        self.assertEqual([job.payload["n"] for job in claimed], [0, 1])
+        self.assertEqual(Job.objects.claim(10, LEASE), [])
+
+    @override_settings(BLOG_TASKS_EAGER=False)
+    def test_jobs_commit_with_the_content(self):
+        author = get_user_model().objects.create_user("author")
+        for title in ("One", "Two"):
+            with transaction.atomic():
+                Entry.objects.create(
+                    title=title, slug=title, content="<p>Post</p>", author=author
+                )
+        try:
+            with transaction.atomic():
+                Entry.objects.create(
+                    title="Gone", slug="gone", content="<p>Gone</p>", author=author
+                )
+                raise ValueError
+        except ValueError:
+            pass
+        # One job per transaction that committed
+        self.assertEqual(
+            [
+                job.payload["pks"]
+                for job in Job.objects.filter(task="reindex_search").order_by("id")
+            ],
+            [[pk] for pk in Entry.objects.order_by("pk").values_list("pk", flat=True)],
+        )
+
+
+class RenderStaticTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        alpha, beta = [Tag.objects.create(tag=tag) for tag in ("alpha", "beta")]
+        cls.entry = Entry.objects.create(
+            title="Hello",
+            slug="hello",
+            content="<p>Hello</p>",
+            author=get_user_model().objects.create_user("author"),
+            created_time=datetime.datetime(2021, 1, 5, 12, tzinfo=utc),
+            pub_time=datetime.datetime(2021, 1, 5, 12, tzinfo=utc),
+        )
+        cls.entry.tags.add(alpha)
+        cls.links = []
+        for slug in ("linka", "linkb"):
+            blogmark = Blogmark.objects.create(
+                link_url="https://example.com/" + slug,
+                link_title=slug,
+                commentary="",
+                slug=slug,
+                created_time=datetime.datetime(2022, 2, 3, 12, tzinfo=utc),
+            )
+            blogmark.tags.add(alpha)
+            cls.links.append(blogmark)
+        cls.quote = Quotation.objects.create(
+            quotation="Quote",
+            source="Someone",
+            slug="quote",
+            created_time=datetime.datetime(2019, 6, 1, 12, tzinfo=utc),
+        )
+        cls.quote.tags.add(beta)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def render(self, *args):
+        out = io.StringIO()
+        call_command(
+            "render_static",
+            self.output_dir,
+            "--base-url",
+            "http://testserver",
+            "--processes",
+            "1",
+            *args,
+            stdout=out,
+            stderr=out,
+        )
+        return out.getvalue()
+
+    def read(self, obj):
+        path = os.path.join(self.output_dir, obj.get_absolute_url().lstrip("/"))
+        with open(os.path.join(path, "index.html")) as f:
+            return f.read()
+
+    def test_only_changed_pages_are_rendered_again(self):
+        output = self.render()
+        self.assertIn(", 0 to remove\n", output)
+        self.assertIn(" 0 failed", output)
+        self.assertIn("0 to render", self.render())
+        self.assertRegex(self.read(self.links[0]), r"alpha\s*<span[^>]*>3</span>")
+
+        before = render_static.Command().page_fingerprints()
+        blogmark = Blogmark.objects.create(
+            link_url="https://example.com/linkc",
+            link_title="linkc",
+            commentary="",
+            slug="linkc",
+            created_time=datetime.datetime(2022, 3, 1, 12, tzinfo=utc),
+        )
+        blogmark.tags.add(Tag.objects.get(tag="alpha"))
+        after = render_static.Command().page_fingerprints()
+        changed = {url for url in after if before.get(url) != after[url]}
+        # Its own pages, and those showing the alpha count it changed
+        for url in (
+            blogmark.get_absolute_url(),
+            self.links[0].get_absolute_url(),
+            self.entry.get_absolute_url(),
+            reverse("blog:home"),
+            reverse("blog:tag_detail", args=["alpha"]),
+        ):
+            self.assertIn(url, changed)
+        for url in (
+            self.quote.get_absolute_url(),
+            reverse("blog:entry_archive_year", args=[2019]),
+            reverse("blog:tag_detail", args=["beta"]),
+        ):
+            self.assertNotIn(url, changed)
+
+        self.assertIn("%d to render" % len(changed), self.render())
+        self.assertRegex(self.read(self.links[0]), r"alpha\s*<span[^>]*>4</span>")
+
+    def test_deleted_pages_are_removed(self):
+        self.render()
+        url = self.quote.get_absolute_url()
+        path = os.path.join(self.output_dir, url.lstrip("/"), "index.html")
+        self.assertTrue(os.path.exists(path + ".gz"))
+        self.quote.delete()
+        self.assertIn(" to remove\n", self.render())
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + ".gz"))
+        with open(os.path.join(self.output_dir, render_static.MANIFEST)) as f:
+            manifest = json.load(f)
+        self.assertNotIn(url, manifest)
+        self.assertNotIn(reverse("blog:tag_detail", args=["beta"]), manifest)
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "page-cache-tests",
+        }
+    }
+)
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.py, cls.rs = [Tag.objects.create(tag=tag) for tag in ("py", "rs")]
+        author = get_user_model().objects.create_user("author")
+        cls.entry, cls.other = [
+            Entry.objects.create(
+                title=title,
+                slug=title.lower(),
+                content="<p>%s</p>" % title,
+                author=author,
+                created_time=when,
+                pub_time=when,
+            )
+            for title, when in (
+                ("First", datetime.datetime(2021, 3, 5, 12, tzinfo=utc)),
+                ("Other", datetime.datetime(2020, 6, 5, 12, tzinfo=utc)),
+            )
+        ]
+        cls.entry.tags.add(cls.py)
+        cls.other.tags.add(cls.rs)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url):
+        """The page's content and the number of queries it took"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response.content.decode(), len(queries)
+
+    def assertCached(self, *urls):
+        for url in urls:
+            self.assertEqual(self.get(url)[1], 0, url)
+
+    def assertRefreshed(self, *urls, showing=None):
+        for url in urls:
+            content, queries = self.get(url)
+            self.assertGreater(queries, 0, url)
+            if showing:
+                self.assertIn(showing, content, url)
+
+    def test_editing_an_item_refreshes_its_pages(self):
+        urls = ["/", "/tags/py/", "/2021/", self.entry.get_absolute_url()]
+        untouched = ["/2020/", "/tags/rs/", self.other.get_absolute_url()]
+        for url in urls + untouched:
+            self.get(url)
+        self.assertCached(*urls + untouched)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.title = "Retitled"
+            self.entry.save()
+        self.assertRefreshed(*urls, showing="Retitled")
+        self.assertCached(*untouched)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.tags.add(Tag.objects.create(tag="new"))
+        self.assertRefreshed(*urls)
+        self.assertIn("/tags/new/", self.get("/")[0])
+        self.assertIn("/tags/new/", self.get(self.entry.get_absolute_url())[0])
+        self.assertRefreshed("/tags/new/", showing="Retitled")
+
+    def test_moving_and_deleting_an_item(self):
+        for url in ("/", "/2021/", "/2019/", "/tags/py/"):
+            self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.created_time = datetime.datetime(2019, 1, 2, 12, tzinfo=utc)
+            self.entry.save()
+        self.assertNotIn("First", self.get("/2021/")[0])
+        self.assertIn("First", self.get("/2019/")[0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.delete()
+        for url in ("/", "/2019/"):
+            self.assertNotIn("First", self.get(url)[0])
+        self.assertEqual(self.client.get("/tags/py/").status_code, 404)
+
+    def test_renaming_a_tag_refreshes_pages_showing_it(self):
+        urls = ["/", "/2021/03/05/", self.entry.get_absolute_url()]
+        for url in urls:
+            self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.py.tag = "python"
+            self.py.save()
+        self.assertRefreshed(*urls, showing="/tags/python/")
+
+    def test_pages_invalidated_while_rendering_are_not_stored(self):
+        render = IndexListView.get_context_data
+
+        def invalidated_while_rendering(view, **kwargs):
+            context = render(view, **kwargs)
+            # As if another process saved an item at this point
+            cache.set(DEPENDENCY_KEY % TIMELINE_DEPENDENCY, time.time_ns())
+            return context
+
+        with mock.patch.object(
+            IndexListView, "get_context_data", invalidated_while_rendering
+        ):
+            self.get("/")
+            self.assertRefreshed("/")
+        self.get("/")
+        self.assertCached("/")
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "fragment-cache-tests",
+        }
+    }
+)
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(tag="py")
+        cls.entry = Entry.objects.create(
+            title="First",
+            slug="first",
+            content="<p>First</p>",
+            author=get_user_model().objects.create_user("author"),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def render(self):
+        """The entry's listing markup and how many times it was rendered"""
+        entry = Entry.objects.get(pk=self.entry.pk)
+        with mock.patch.object(
+            blog_tags, "render_to_string", wraps=blog_tags.render_to_string
+        ) as render_to_string:
+            items = blog_tags.render_items([{"type": "entry", "obj": entry}], True)
+        return items[0]["html"], render_to_string.call_count
+
+    def test_edits_retire_cached_fragments(self):
+        self.assertEqual(self.render()[1], 1)
+        self.assertEqual(self.render()[1], 0)
+
+        entry = Entry.objects.get(pk=self.entry.pk)
+        entry.title = "Retitled"
+        entry.save()
+        html, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn("Retitled", html)
+        self.assertEqual(self.render(), (html, 0))
+
+        entry.tags.add(self.tag)
+        html, renders = self.render()
+        self.assertEqual(renders, 1)
+        self.assertIn("/tags/py/", html)
+        self.assertEqual(self.render(), (html, 0))
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "conditional-get-tests",
+        }
+    }
+)
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.entry = Entry.objects.create(
+            title="First",
+            slug="first",
+            content="<p>First</p>",
+            author=get_user_model().objects.create_superuser("admin", "", None),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_if_none_match(self):
+        response = self.client.get("/")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(
+            self.client.get("/", HTTP_IF_NONE_MATCH='"other"').status_code, 200
+        )
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get("/")["Last-Modified"]
+        response = self.client.get("/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_makes_the_etag_stale(self):
+        response = self.client.get("/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.title = "Retitled"
+            self.entry.save()
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Retitled")
+        self.assertEqual(
+            self.client.get("/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code,
+            304,
+        )
+
+    def test_signed_in_requests_bypass_the_cache(self):
+        etag = self.client.get("/")["ETag"]
+        self.client.force_login(self.entry.author)
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sitemap-tests",
+        }
+    }
+)
+@mock.patch.object(sitemaps, "STREAM_CHUNK", 1)
+@mock.patch.object(sitemaps, "SHARD_SIZE", 2)
+class SitemapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user("author")
+        # With two items to a shard, 10 closes shard 4 and 11 opens shard 5
+        cls.entries = {
+            pk: Entry.objects.create(
+                pk=pk,
+                title="Entry %d" % pk,
+                slug="entry-%d" % pk,
+                content="<p>Entry</p>",
+                author=author,
+                status=status,
+            )
+            for pk, status in ((9, "p"), (10, "p"), (11, "p"), (12, "d"), (14, "d"))
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def shard(self, shard):
+        response = self.client.get("/sitemap-entry-%d.xml" % shard)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def urls(self, content):
+        return {
+            loc: datetime.datetime.fromisoformat(lastmod)
+            for loc, lastmod in re.findall(
+                r"<loc>(.*?)</loc><lastmod>(.*?)</lastmod>", content
+            )
+        }
+
+    def entry_url(self, pk):
+        return "http://testserver" + self.entries[pk].get_absolute_url()
+
+    def test_index_lists_shards_with_published_items(self):
+        urls = self.urls(self.client.get("/sitemap.xml").content.decode())
+        self.assertEqual(
+            urls,
+            {
+                "http://testserver/sitemap-entry-4.xml": max(
+                    self.entries[pk].updated_time for pk in (9, 10)
+                ),
+                "http://testserver/sitemap-entry-5.xml": self.entries[11].updated_time,
+            },
+        )
+
+    def test_shards_split_at_the_boundary(self):
+        self.assertEqual(
+            self.urls(b"".join(self.shard(4).streaming_content).decode()),
+            {
+                self.entry_url(pk): self.entries[pk].updated_time.replace(microsecond=0)
+                for pk in (9, 10)
+            },
+        )
+        # The draft shares shard 5 but is left out of it
+        self.assertEqual(
+            self.urls(b"".join(self.shard(5).streaming_content).decode()),
+            {self.entry_url(11): self.entries[11].updated_time.replace(microsecond=0)},
+        )
+        # Shard 6 holds nothing but a draft
+        self.assertEqual(
+            self.urls(b"".join(self.shard(6).streaming_content).decode()), {}
+        )
+
+    def test_only_complete_shards_are_cached(self):
+        view = sitemaps.SitemapShardView()
+        # A client that goes away part way through
+        stream = view.stream("shard", "http://testserver", "entry", 4)
+        next(stream)
+        next(stream)
+        stream.close()
+        self.assertIsNone(cache.get("shard"))
+        complete = "".join(view.stream("shard", "http://testserver", "entry", 4))
+        self.assertEqual(cache.get("shard"), complete)
+
+        response = self.shard(4)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), complete.encode())
+        response = self.shard(4)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, complete.encode())
+
+        # Saving an item in the shard retires the cached copy
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entries[10].save()
+        self.assertTrue(self.shard(4).streaming)
+
+
+class PageViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user("author")
+        cls.first, cls.second = [
+            Entry.objects.create(
+                title=title, slug=title, content="<p>Post</p>", author=author
+            )
+            for title in ("first", "second")
+        ]
+
+    def request(
+        self, user_agent="Mozilla/5.0 (X11; Linux x86_64) Firefox/120.0", **extra
+    ):
+        request = RequestFactory().get("/", HTTP_USER_AGENT=user_agent, **extra)
+        request.user = AnonymousUser()
+        return request
+
+    def test_is_human(self):
+        self.assertTrue(pageviews.is_human(self.request()))
+        for user_agent in (
+            "",
+            "Googlebot/2.1 (+http://www.google.com/bot.html)",
+            "curl/8.4.0",
+            "python-requests/2.31",
+            "Slackbot-LinkExpanding 1.0",
+        ):
+            self.assertFalse(pageviews.is_human(self.request(user_agent)), user_agent)
+        self.assertFalse(pageviews.is_human(self.request(HTTP_SEC_PURPOSE="prefetch")))
+        request = self.request()
+        request.user = self.first.author
+        request.user.is_staff = True
+        self.assertFalse(pageviews.is_human(request))
+
+    def test_record_view_buffers_human_views(self):
+        buffer = pageviews.ViewBuffer()
+        with mock.patch.object(pageviews, "buffer", buffer):
+            pageviews.record_view(self.request(), self.first.pk)
+            pageviews.record_view(self.request(), self.first.pk)
+            pageviews.record_view(self.request("Googlebot/2.1"), self.first.pk)
+            pageviews.record_view(self.request(), self.second.pk)
+            post = self.request()
+            post.method = "POST"
+            pageviews.record_view(post, self.second.pk)
+        self.assertEqual(buffer.counts, {self.first.pk: 2, self.second.pk: 1})
+        self.assertEqual(EntryViewDelta.objects.count(), 0)
+        buffer.spill()
+        self.assertIsNone(buffer.timer)
+        self.assertEqual(
+            dict(EntryViewDelta.objects.values_list("entry_id", "views")),
+            {self.first.pk: 2, self.second.pk: 1},
+        )
+
+    def test_buffer_spills_when_full(self):
+        buffer = pageviews.ViewBuffer()
+        for _ in range(pageviews.BUFFER_SIZE):
+            buffer.add(self.first.pk)
+        self.assertEqual(buffer.counts, {})
+        self.assertEqual(EntryViewDelta.objects.get().views, pageviews.BUFFER_SIZE)
+
+    def test_idle_buffer_spills_on_a_timer(self):
+        spilled = threading.Event()
+        buffer = pageviews.ViewBuffer()
+        with mock.patch.object(pageviews, "BUFFER_SECONDS", 0.05), mock.patch.object(
+            EntryViewDelta.objects, "record", side_effect=lambda counts: spilled.set()
+        ) as record:
+            buffer.add(self.first.pk)
+            self.assertTrue(spilled.wait(5))
+        record.assert_called_once_with({self.first.pk: 1})
+        self.assertEqual(buffer.counts, {})
+
+    def test_flush_adds_up_views_and_scores(self):
+        EntryViewDelta.objects.record({self.first.pk: 3, self.second.pk: 1})
+        EntryViewDelta.objects.record({self.first.pk: 1})
+        self.assertEqual(EntryViewDelta.objects.flush(at=0), 2)
+        EntryViewDelta.objects.record({self.first.pk: 2})
+        self.assertEqual(EntryViewDelta.objects.flush(at=0), 1)
+        self.assertEqual(EntryViewDelta.objects.flush(at=0), 0)
+
+        self.assertEqual(EntryViewDelta.objects.count(), 0)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.views, self.second.views), (6, 1))
+        # At t=0 no period has decayed, so every score is log(views)
+        scores = PopularEntry.objects.filter(entry=self.first)
+        self.assertEqual(len(scores), len(PopularEntry.HALF_LIVES))
+        for score in scores:
+            self.assertAlmostEqual(score.score, math.log(6))
+
+
+class PopularEntryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user("author")
+        cls.older, cls.newer = [
+            Entry.objects.create(
+                title=title, slug=title, content="<p>Post</p>", author=author
+            )
+            for title in ("Older favourite", "Newer favourite")
+        ]
+
+    def test_scores_decay_by_period(self):
+        start = 1_700_000_000
+        EntryViewDelta.objects.record({self.older.pk: 60})
+        EntryViewDelta.objects.flush(at=start)
+        # Views at the same moment add up: log(exp(a) + exp(b))
+        EntryViewDelta.objects.record({self.older.pk: 40})
+        EntryViewDelta.objects.flush(at=start)
+        EntryViewDelta.objects.record({self.newer.pk: 40})
+        EntryViewDelta.objects.flush(at=start + 2 * 24 * 60 * 60)
+
+        scores = {
+            (score.entry_id, score.period): score.score
+            for score in PopularEntry.objects.all()
+        }
+        # Two days on, the older views count for a quarter in the day period
+        # and 2 ** (-2 / 7) in the week period; they never fade in all time
+        for period, factor in (
+            (PopularEntry.DAY, 1 / 4),
+            (PopularEntry.WEEK, 2 ** (-2 / 7)),
+            (PopularEntry.ALL_TIME, 1),
+        ):
+            self.assertAlmostEqual(
+                scores[(self.older.pk, period)] - scores[(self.newer.pk, period)],
+                math.log(100 * factor / 40),
+                places=6,
+            )
+
+        def ranking(period):
+            return [score.entry for score in PopularEntry.objects.top(period)]
+
+        self.assertEqual(ranking(PopularEntry.DAY), [self.newer, self.older])
+        self.assertEqual(ranking(PopularEntry.WEEK), [self.older, self.newer])
+        self.assertEqual(ranking(PopularEntry.ALL_TIME), [self.older, self.newer])
+
+        content = self.client.get("/popular/day/").content.decode()
+        self.assertLess(
+            content.index("Newer favourite"), content.index("Older favourite")
+        )
+        content = self.client.get("/popular/").content.decode()
+        self.assertLess(
+            content.index("Older favourite"), content.index("Newer favourite")
+        )
+
+    def test_drafts_are_left_out(self):
+        EntryViewDelta.objects.record({self.older.pk: 5, self.newer.pk: 1})
+        EntryViewDelta.objects.flush(at=0)
+        Entry.objects.filter(pk=self.older.pk).update(status="d")
+        self.assertEqual(
+            [score.entry for score in PopularEntry.objects.top(PopularEntry.DAY)],
+            [self.newer],
+        )
@@ -1,4 +1,6 @@
 from django.urls import path
+from .feeds import FeedView
+from .sitemaps import SitemapIndexView, SitemapShardView
 from .views import (
     IndexListView,
     EntryDetailView,
@@ -10,6 +12,8 @@ from .views import (
     LinkDetailView,
     QuoteDetailView,
     ArchiveView,
+    ArchiveMonthItemsView,
+    PopularView,
 )
 
 app_name = "blog"
@@ -33,6 +37,11 @@ urlpatterns = [
     ),
     path("search/", EntrySearchView.as_view(), name="search"),
     path("tags/<tags>/", TagArchiveView.as_view(), name="tag_detail"),
+    path("tags/<str:tag>/feed/", FeedView.as_view(), name="tag_feed"),
+    path("feed/", FeedView.as_view(), name="feed"),
+    path("feed/entries/", FeedView.as_view(type_name="entry"), name="entry_feed"),
+    path("feed/links/", FeedView.as_view(type_name="blogmark"), name="link_feed"),
+    path("feed/quotes/", FeedView.as_view(type_name="quotation"), name="quote_feed"),
     path(
         "links/<int:year>/<int:month>/<int:day>/<str:slug>/",
         LinkDetailView.as_view(month_format="%m"),
@@ -43,5 +52,18 @@ urlpatterns = [
         QuoteDetailView.as_view(month_format="%m"),
         name="quote_detail",
     ),
+    path("sitemap.xml", SitemapIndexView.as_view(), name="sitemap"),
+    path(
+        "sitemap-<str:type_name>-<int:shard>.xml",
+        SitemapShardView.as_view(),
+        name="sitemap_shard",
+    ),
     path("archive/", ArchiveView.as_view(), name="archive_view"),
+    path(
+        "archive/<int:year>/<int:month>/",
+        ArchiveMonthItemsView.as_view(),
+        name="archive_month_items",
+    ),
+    path("popular/", PopularView.as_view(), name="popular"),
+    path("popular/<str:period>/", PopularView.as_view(), name="popular_period"),
 ]
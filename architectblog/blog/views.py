@@ -1,12 +1,8 @@
-import datetime
 import time
-from itertools import chain
-from operator import attrgetter
 
 from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.db import models
-from django.db.models.functions import TruncMonth, TruncYear
 from django.http import Http404
 from django.shortcuts import render
 from django.views.generic.base import TemplateView
@@ -19,276 +15,258 @@ from django.views.generic.dates import (
 from django.views.generic.list import ListView
 from django.http import HttpResponse
 
-from .models import Entry, Blogmark, Quotation, Tag, load_mixed_objects
+from .models import (
+    Entry,
+    Blogmark,
+    Quotation,
+    MonthlyRollup,
+    PopularEntry,
+    Tag,
+    MixedObjectLoader,
+    TimelineItem,
+)
+from .caching import (
+    TIMELINE_DEPENDENCY,
+    PageCacheMixin,
+    date_dependency,
+    tag_dependency,
+)
+from .facets import SearchFilters, search_facets
+from .pagination import CountedPaginator, InvalidCursor, paginate_timeline
+from .pageviews import record_view
 
 
 class HomeView(TemplateView):
     template_name = "flatpages/default.html"
 
 
-class IndexListView(ListView):
+class IndexListView(PageCacheMixin, TemplateView):
     template_name = "blog/index.html"
-    context_object_name = "entries"
-
-    def get_queryset(self):
-        queryset = Entry.objects.order_by("-created_time").prefetch_related("tags")
-
-        return queryset
+    paginate_by = 30
 
     def get_context_data(self, **kwargs):
-        entries = self.get_queryset()
-        blogmarks = Blogmark.objects.order_by("-created_time").prefetch_related("tags")
-        quotations = Quotation.objects.order_by("-created_time").prefetch_related(
-            "tags"
-        )
-
-        items = sorted(
-            chain(entries, blogmarks, quotations),
-            key=attrgetter("created_time"),
-            reverse=True,
-        )
+        try:
+            page = paginate_timeline(
+                TimelineItem.objects.all(),
+                self.paginate_by,
+                older=self.request.GET.get("older"),
+                newer=self.request.GET.get("newer"),
+            )
+        except InvalidCursor:
+            raise Http404
 
         context = super(IndexListView, self).get_context_data(**kwargs)
-        context["items"] = items
+        # The front page shows entries in full
+        items = MixedObjectLoader.for_request(self.request).load(
+            page.rows, fields=["content"]
+        )
+        context["items"] = [obj for obj in items if obj]
+        self.depends_on(TIMELINE_DEPENDENCY)
+        self.depends_on_items(context["items"])
+        self.depends_on(
+            *[tag_dependency(t.pk) for obj in context["items"] for t in obj.tags.all()]
+        )
+        context["older_cursor"] = page.older_cursor
+        context["newer_cursor"] = page.newer_cursor
 
         return context
 
 
-class EntryDetailView(DateDetailView):
+class EntryDetailView(PageCacheMixin, DateDetailView):
     template_name = "blog/entry_detail.html"
-    queryset = Entry.objects.all()
+    queryset = Entry.objects.for_detail().prefetch_related("tags")
     context_object_name = "entry"
     date_field = "pub_time"
     slug_url_kwarg = "slug"
 
     def get_context_data(self, **kwargs):
         context = super(EntryDetailView, self).get_context_data(**kwargs)
+        self.depends_on_items([self.object])
+        self.depends_on(*[tag_dependency(tag.pk) for tag in self.object.tags.all()])
         return context
 
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        # Kept on the response so it is still known when served from cache
+        response.entry_pk = self.object.pk
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, "entry_pk"):
+            record_view(request, response.entry_pk)
+        return response
+
 
-class LinkDetailView(DateDetailView):
+class LinkDetailView(PageCacheMixin, DateDetailView):
     template_name = "blog/link_detail.html"
-    queryset = Blogmark.objects.all()
+    queryset = Blogmark.objects.for_detail().prefetch_related("tags")
     context_object_name = "link"
     date_field = "created_time"
     slug_url_kwarg = "slug"
 
     def get_context_data(self, **kwargs):
         context = super(LinkDetailView, self).get_context_data(**kwargs)
+        self.depends_on_items([self.object])
+        self.depends_on(*[tag_dependency(tag.pk) for tag in self.object.tags.all()])
         return context
 
 
-class QuoteDetailView(DateDetailView):
+class QuoteDetailView(PageCacheMixin, DateDetailView):
     template_name = "blog/quote_detail.html"
-    queryset = Quotation.objects.all()
+    queryset = Quotation.objects.for_detail().prefetch_related("tags")
     context_object_name = "quote"
     date_field = "created_time"
     slug_url_kwarg = "slug"
 
     def get_context_data(self, **kwargs):
         context = super(QuoteDetailView, self).get_context_data(**kwargs)
+        self.depends_on_items([self.object])
+        self.depends_on(*[tag_dependency(tag.pk) for tag in self.object.tags.all()])
         return context
 
 
-class EntryYearArchiveView(YearArchiveView):
+def display_counts(counts):
+    """Turns a rollup's {type: count} dict into the pairs the templates show"""
+    return [
+        ("entry", counts.get("entry", 0)),
+        ("quote", counts.get("quotation", 0)),
+        ("link", counts.get("blogmark", 0)),
+    ]
+
+
+class EntryYearArchiveView(PageCacheMixin, YearArchiveView):
     template_name = "blog/year_archive.html"
-    model = Entry
+    queryset = Entry.objects.for_listing()
     date_field = "created_time"
-    make_object_list = True
     context_object_name = "entry_list"
     allow_empty = True
 
+    def get_rollup_months(self):
+        if not hasattr(self, "_rollup_months"):
+            self._rollup_months = MonthlyRollup.objects.for_year(int(self.get_year()))
+        return self._rollup_months
+
+    def get_date_list(self, queryset, date_type=None, ordering="ASC"):
+        # Months with any kind of content, from the rollup table
+        return [month["date"] for month in self.get_rollup_months()]
+
     def get_context_data(self, **kwargs):
-        year = self.kwargs["year"]
+        items_by_month = {}
+        for obj in MixedObjectLoader.for_request(self.request).load(
+            [
+                dict(item.as_dict(), month=item.month)
+                for item in TimelineItem.objects.filter(year=self.kwargs["year"])
+            ]
+        ):
+            if obj:
+                items_by_month.setdefault(obj.original_dict["month"], []).append(obj)
+
         months = []
-        for month in range(1, 12 + 1):
-            date = datetime.date(year=year, month=month, day=1)
-            entries = Entry.objects.filter(
-                created_time__year=year, created_time__month=month
-            )
-            quotes = Quotation.objects.filter(
-                created_time__year=year, created_time__month=month
-            )
-            links = Blogmark.objects.filter(
-                created_time__year=year, created_time__month=month
-            )
-            items = sorted(
-                chain(entries, links, quotes),
-                key=attrgetter("created_time"),
-                reverse=True,
+        for month in self.get_rollup_months():
+            counts = display_counts(month["counts"])
+            months.append(
+                {
+                    "date": month["date"],
+                    "items": items_by_month.get(month["date"].month, []),
+                    "counts": counts,
+                    "counts_not_0": [p for p in counts if p[1]],
+                }
             )
-            entry_count = entries.count()
-            link_count = links.count()
-            quote_count = quotes.count()
-            month_count = entry_count + link_count + quote_count
-
-            if month_count:
-                counts = [
-                    ("entry", entry_count),
-                    ("quote", quote_count),
-                    ("link", link_count),
-                ]
-                counts_not_0 = [p for p in counts if p[1]]
-                months.append(
-                    {
-                        "date": date,
-                        "items": items,
-                        "counts": counts,
-                        "counts_not_0": counts_not_0,
-                        "entries": list(
-                            Entry.objects.filter(
-                                created_time__year=year,
-                                created_time__month=month,
-                            ).order_by("created_time")
-                        ),
-                    }
-                )
 
         context = super(EntryYearArchiveView, self).get_context_data(**kwargs)
         context["months"] = months
+        self.depends_on(date_dependency(self.kwargs["year"]))
+        self.depends_on_items([obj for objs in items_by_month.values() for obj in objs])
         return context
 
 
-class EntryMonthArchiveView(MonthArchiveView):
+class EntryMonthArchiveView(PageCacheMixin, MonthArchiveView):
     template_name = "blog/month_archive.html"
     date_field = "created_time"
-    model = Entry
+    queryset = Entry.objects.for_listing()
     allow_empty = True
 
     def get_context_data(self, **kwargs):
-        year = self.kwargs["year"]
-        month = self.kwargs["month"]
-        entries = list(
-            Entry.objects.filter(
-                created_time__year=year, created_time__month=month
-            ).order_by("-created_time")
-        )
-        blogmarks = list(
-            Blogmark.objects.filter(
-                created_time__year=year, created_time__month=month
-            ).order_by("-created_time")
-        )
-        quotations = list(
-            Quotation.objects.filter(
-                created_time__year=year, created_time__month=month
-            ).order_by("-created_time")
+        items = MixedObjectLoader.for_request(self.request).load(
+            [
+                item.as_dict()
+                for item in TimelineItem.objects.filter(
+                    year=self.kwargs["year"], month=self.kwargs["month"]
+                )
+            ]
         )
-
-        # items = sorted(
-        #     chain(entries, blogmarks, quotations),
-        #     key=attrgetter("created_time"),
-        #     reverse=True,
-        # )
+        entries = [obj for obj in items if obj and obj.type == "entry"]
+        blogmarks = [obj for obj in items if obj and obj.type == "blogmark"]
+        quotations = [obj for obj in items if obj and obj.type == "quotation"]
 
         context = super(EntryMonthArchiveView, self).get_context_data(**kwargs)
         context["entries"] = entries
         context["blogmarks"] = blogmarks
         context["quotations"] = quotations
+        self.depends_on(date_dependency(self.kwargs["year"], self.kwargs["month"]))
+        self.depends_on_items(entries + blogmarks + quotations)
         return context
 
 
-class EntryDayArchiveView(DayArchiveView):
+class EntryDayArchiveView(PageCacheMixin, DayArchiveView):
     template_name = "blog/day_archive.html"
     date_field = "created_time"
-    model = Entry
+    queryset = Entry.objects.for_listing()
     context_object_name = "entry_list"
     allow_empty = True
 
     def get_context_data(self, **kwargs):
-        year = self.kwargs["year"]
-        month = self.kwargs["month"]
-        day = self.kwargs["day"]
-        entries = list(
-            Entry.objects.filter(
-                created_time__year=year,
-                created_time__month=month,
-                created_time__day=day,
-            ).order_by("created_time")
-        )
-        blogmarks = list(
-            Blogmark.objects.filter(
-                created_time__year=year,
-                created_time__month=month,
-                created_time__day=day,
-            ).order_by("created_time")
-        )
-        quotations = list(
-            Quotation.objects.filter(
-                created_time__year=year,
-                created_time__month=month,
-                created_time__day=day,
-            ).order_by("created_time")
-        )
-
-        items = sorted(
-            chain(entries, blogmarks, quotations),
-            key=attrgetter("created_time"),
-            reverse=True,
+        items = MixedObjectLoader.for_request(self.request).load(
+            [
+                item.as_dict()
+                for item in TimelineItem.objects.filter(
+                    year=self.kwargs["year"],
+                    month=self.kwargs["month"],
+                    day=self.kwargs["day"],
+                )
+            ],
+            fields=["content"],
         )
+        items = [obj for obj in items if obj]
 
         context = super(EntryDayArchiveView, self).get_context_data(**kwargs)
         context["items"] = items
+        self.depends_on(
+            date_dependency(
+                self.kwargs["year"], self.kwargs["month"], self.kwargs["day"]
+            )
+        )
+        self.depends_on_items(items)
+        self.depends_on(
+            *[tag_dependency(t.pk) for obj in items for t in obj.tags.all()]
+        )
 
         return context
 
 
-# This query gets the IDs of things that match all of the tags
-INTERSECTION_SQL = """
-    SELECT %(content_table)s.id
-        FROM %(content_table)s, %(tag_table)s
-    WHERE %(tag_table)s.tag_id IN (
-            SELECT id FROM blog_tag WHERE tag IN (%(joined_tags)s)
-        )
-        AND %(tag_table)s.%(tag_table_content_key)s = %(content_table)s.id
-    GROUP BY %(content_table)s.id
-        HAVING COUNT(%(content_table)s.id) = %(tag_count)d
-"""
-
-
-class TagArchiveView(TemplateView):
+class TagArchiveView(PageCacheMixin, TemplateView):
     template_name = "blog/tag_archive.html"
+    paginate_by = 30
 
     def get_context_data(self, **kwargs):
-        tags = self.kwargs["tags"]
-        tags = Tag.objects.filter(tag__in=tags.split("+")).values_list(
-            "tag", flat=True
-        )[:3]
+        names = self.kwargs["tags"].split("+")
+        tags = sorted(
+            Tag.objects.filter(tag__in=names)[:3], key=lambda t: names.index(t.tag)
+        )
         if not tags:
             raise Http404
-        items = []
-        from django.db import connection
-
-        cursor = connection.cursor()
-        for model, content_type in (
-            (Entry, "entry"),
-            (Quotation, "quotation"),
-            (Blogmark, "blogmark"),
-        ):
-            cursor.execute(
-                INTERSECTION_SQL
-                % {
-                    "content_table": "blog_%s" % content_type,
-                    "tag_table": "blog_%s_tags" % content_type,
-                    "tag_table_content_key": "%s_id" % content_type,
-                    "joined_tags": ", ".join(["'%s'" % tag for tag in tags]),
-                    "tag_count": len(tags),
-                }
-            )
-            ids = [r[0] for r in cursor.fetchall()]
-            items.extend(
-                [
-                    {"type": content_type, "obj": obj}
-                    for obj in list(
-                        model.objects.prefetch_related("tags").in_bulk(ids).values()
-                    )
-                ]
-            )
-        if not items:
-            raise Http404
-        items.sort(key=lambda x: x["obj"].created_time, reverse=True)
 
-        # Paginate it
-        paginator = Paginator(items, 30)
+        # Items carrying every one of the tags, newest first; only the rows for
+        # the requested page are fetched and hydrated
+        queryset = TimelineItem.objects.filter(tag_ids__contains=[t.pk for t in tags])
+        paginator = CountedPaginator(
+            queryset,
+            self.paginate_by,
+            count=tags[0].total_count() if len(tags) == 1 else None,
+        )
+        if not paginator.count:
+            raise Http404
         page_number = self.request.GET.get("page") or "1"
         try:
             page = paginator.page(page_number)
@@ -297,151 +275,89 @@ class TagArchiveView(TemplateView):
         except EmptyPage:
             raise Http404
 
+        items = [
+            {"type": obj.type, "obj": obj}
+            for obj in MixedObjectLoader.for_request(self.request).load(
+                [item.as_dict() for item in page.object_list]
+            )
+            if obj
+        ]
+
         context = super(TagArchiveView, self).get_context_data(**kwargs)
-        context["tags"] = tags
-        context["items"] = page.object_list
+        context["tags"] = [t.tag for t in tags]
+        context["items"] = items
         context["total"] = paginator.count
         context["page"] = page
         context["only_one_tag"] = len(tags) == 1
-        context["tag"] = Tag.objects.get(tag=tags[0])
+        context["tag"] = tags[0]
+        self.depends_on(*[tag_dependency(tag.pk) for tag in tags])
+        self.depends_on_items([item["obj"] for item in items])
 
         return context
 
 
 class EntrySearchView(ListView):
     template_name = "blog/search.html"
-    model = Entry
+    queryset = Entry.objects.for_listing()
 
     def get_context_data(self, **kwargs):
 
         q = self.request.GET.get("q", "").strip()
         start = time.time()
 
-        query = None
-        rank_annotation = None
-        if q:
-            query = SearchQuery(q, search_type="websearch")
-            rank_annotation = SearchRank(models.F("search_document"), query)
-
         selected_tags = self.request.GET.getlist("tag")
         excluded_tags = self.request.GET.getlist("exclude.tag")
         selected_type = self.request.GET.get("type", "")
         selected_year = self.request.GET.get("year", "")
         selected_month = self.request.GET.get("month", "")
 
-        values = ["pk", "type", "created_time"]
+        filters = SearchFilters.from_request(self.request)
+        facets = search_facets(filters)
+
         if q:
-            values.append("rank")
+            query = SearchQuery(q, search_type="websearch")
+            rank_annotation = SearchRank(models.F("search_document"), query)
+            values = ["pk", "type", "created_time", "rank"]
 
-        def make_queryset(klass, type_name):
-            qs = klass.objects.annotate(
-                type=models.Value(type_name, output_field=models.CharField())
-            )
-            if selected_year and selected_year.isdigit() and 2000 <= int(selected_year):
-                qs = qs.filter(created_time__year=int(selected_year))
-            if (
-                selected_month
-                and selected_month.isdigit()
-                and 1 <= int(selected_month) <= 12
-            ):
-                qs = qs.filter(created_time__month=int(selected_month))
-            if q:
+            def make_queryset(klass, type_name):
+                qs = klass.objects.annotate(
+                    type=models.Value(type_name, output_field=models.CharField())
+                )
+                if filters.year:
+                    qs = qs.filter(created_time__year=filters.year)
+                if filters.month:
+                    qs = qs.filter(created_time__month=filters.month)
                 qs = qs.filter(search_document=query)
                 qs = qs.annotate(rank=rank_annotation)
-            for tag in selected_tags:
-                qs = qs.filter(tags__tag=tag)
-            for exclude_tag in excluded_tags:
-                qs = qs.exclude(tags__tag=exclude_tag)
-            return qs.order_by()
-
-        # Start with a .none() queryset just so we can union stuff onto it
-        qs = Entry.objects.annotate(
-            type=models.Value("empty", output_field=models.CharField())
-        )
-        if q:
-            qs = qs.annotate(rank=rank_annotation)
-        qs = qs.values(*values).none()
-
-        type_counts_raw = {}
-        tag_counts_raw = {}
-        year_counts_raw = {}
-        month_counts_raw = {}
-
-        for klass, type_name in (
-            (Entry, "entry"),
-            (Blogmark, "blogmark"),
-            (Quotation, "quotation"),
-        ):
-            if selected_type and selected_type != type_name:
-                continue
-            klass_qs = make_queryset(klass, type_name)
-            type_count = klass_qs.count()
-            if type_count:
-                type_counts_raw[type_name] = type_count
-            for tag, count in (
-                Tag.objects.filter(**{"%s__in" % type_name: klass_qs})
-                .annotate(n=models.Count("tag"))
-                .values_list("tag", "n")
-            ):
-                tag_counts_raw[tag] = tag_counts_raw.get(tag, 0) + count
-            for row in (
-                klass_qs.order_by()
-                .annotate(year=TruncYear("created_time"))
-                .values("year")
-                .annotate(n=models.Count("pk"))
-            ):
-                year_counts_raw[row["year"]] = (
-                    year_counts_raw.get(row["year"], 0) + row["n"]
+                for tag in selected_tags:
+                    qs = qs.filter(tags__tag=tag)
+                for exclude_tag in excluded_tags:
+                    qs = qs.exclude(tags__tag=exclude_tag)
+                return qs.order_by()
+
+            # Start with a .none() queryset just so we can union stuff onto it
+            qs = (
+                Entry.objects.annotate(
+                    type=models.Value("empty", output_field=models.CharField())
                 )
-            # Only do month counts if a year is selected
-            if selected_year:
-                for row in (
-                    klass_qs.order_by()
-                    .annotate(month=TruncMonth("created_time"))
-                    .values("month")
-                    .annotate(n=models.Count("pk"))
-                ):
-                    month_counts_raw[row["month"]] = (
-                        month_counts_raw.get(row["month"], 0) + row["n"]
-                    )
-            qs = qs.union(klass_qs.values(*values))
-
-        if q:
+                .annotate(rank=rank_annotation)
+                .values(*values)
+                .none()
+            )
+            for klass, type_name in (
+                (Entry, "entry"),
+                (Blogmark, "blogmark"),
+                (Quotation, "quotation"),
+            ):
+                if selected_type and selected_type != type_name:
+                    continue
+                qs = qs.union(make_queryset(klass, type_name).values(*values))
             qs = qs.order_by("-rank")
         else:
-            qs = qs.order_by("-created_time")
-
-        type_counts = sorted(
-            [
-                {"type": type_name, "n": value}
-                for type_name, value in list(type_counts_raw.items())
-            ],
-            key=lambda t: t["n"],
-            reverse=True,
-        )
-        tag_counts = sorted(
-            [{"tag": tag, "n": value} for tag, value in list(tag_counts_raw.items())],
-            key=lambda t: t["n"],
-            reverse=True,
-        )[:40]
-
-        year_counts = sorted(
-            [
-                {"year": year, "n": value}
-                for year, value in list(year_counts_raw.items())
-            ],
-            key=lambda t: t["year"],
-        )
-
-        month_counts = sorted(
-            [
-                {"month": month, "n": value}
-                for month, value in list(month_counts_raw.items())
-            ],
-            key=lambda t: t["month"],
-        )
+            qs = filters.timeline()
 
-        paginator = Paginator(qs, 30)
+        # The facet counts already tell us how many results there are
+        paginator = CountedPaginator(qs, 30, count=facets["total"])
         page_number = self.request.GET.get("page") or "1"
         try:
             page = paginator.page(page_number)
@@ -450,15 +366,17 @@ class EntrySearchView(ListView):
         except EmptyPage:
             raise Http404
 
+        rows = page.object_list if q else [item.as_dict() for item in page.object_list]
         results = []
-        for obj in load_mixed_objects(page.object_list):
-            results.append(
-                {
-                    "type": obj.original_dict["type"],
-                    "rank": obj.original_dict.get("rank"),
-                    "obj": obj,
-                }
-            )
+        for obj in MixedObjectLoader.for_request(self.request).load(rows):
+            if obj:
+                results.append(
+                    {
+                        "type": obj.original_dict["type"],
+                        "rank": obj.original_dict.get("rank"),
+                        "obj": obj,
+                    }
+                )
         end = time.time()
 
         selected = {
@@ -502,10 +420,10 @@ class EntrySearchView(ListView):
         context["total"] = paginator.count
         context["page"] = page
         context["duration"] = end - start
-        context["type_counts"] = type_counts
-        context["tag_counts"] = tag_counts
-        context["year_counts"] = year_counts
-        context["month_counts"] = month_counts
+        context["type_counts"] = facets["types"]
+        context["tag_counts"] = facets["tags"]
+        context["year_counts"] = facets["years"]
+        context["month_counts"] = facets["months"]
         context["selected_tags"] = selected_tags
         context["excluded_tags"] = excluded_tags
         context["selected"] = selected
@@ -514,56 +432,53 @@ class EntrySearchView(ListView):
         return context
 
 
-class ArchiveView(TemplateView):
+class ArchiveView(PageCacheMixin, TemplateView):
     template_name = "blog/archive.html"
-    model = Entry
-
-    def get_context_data(self):
-        for year in range(2021, 2021 + 1):
-            months = []
-            for month in range(1, 12 + 1):
-                date = datetime.date(year=year, month=month, day=1)
-                entries = Entry.objects.filter(
-                    created_time__year=year, created_time__month=month
-                )
-                quotes = Quotation.objects.filter(
-                    created_time__year=year, created_time__month=month
-                )
-                links = Blogmark.objects.filter(
-                    created_time__year=year, created_time__month=month
-                )
-                items = sorted(
-                    chain(entries, links, quotes),
-                    key=attrgetter("created_time"),
-                    reverse=True,
+
+    def get_context_data(self, **kwargs):
+        years = MonthlyRollup.objects.calendar()
+        for year in years:
+            for month in year["months"]:
+                month["counts_not_0"] = [
+                    p for p in display_counts(month["counts"]) if p[1]
+                ]
+
+        context = super(ArchiveView, self).get_context_data(**kwargs)
+        context["years"] = years
+        self.depends_on(TIMELINE_DEPENDENCY)
+        return context
+
+
+class ArchiveMonthItemsView(PageCacheMixin, TemplateView):
+    """The item titles for one month, loaded when it is expanded on the archive"""
+
+    template_name = "blog/archive_month_items.html"
+
+    def get_context_data(self, **kwargs):
+        items = MixedObjectLoader.for_request(self.request).load(
+            [
+                item.as_dict()
+                for item in TimelineItem.objects.filter(
+                    year=self.kwargs["year"], month=self.kwargs["month"]
                 )
-                entry_count = entries.count()
-                link_count = links.count()
-                quote_count = quotes.count()
-                month_count = entry_count + link_count + quote_count
-
-                if month_count:
-                    counts = [
-                        ("entry", entry_count),
-                        ("quote", quote_count),
-                        ("link", link_count),
-                    ]
-                    counts_not_0 = [p for p in counts if p[1]]
-                    months.append(
-                        {
-                            "date": date,
-                            "items": items,
-                            "counts": counts,
-                            "counts_not_0": counts_not_0,
-                            "entries": list(
-                                Entry.objects.filter(
-                                    created_time__year=year,
-                                    created_time__month=month,
-                                ).order_by("created_time")
-                            ),
-                        }
-                    )
-
-        context = super(ArchiveView, self).get_context_data()
-        context["months"] = months
+            ]
+        )
+
+        context = super(ArchiveMonthItemsView, self).get_context_data(**kwargs)
+        context["items"] = [obj for obj in items if obj]
+        self.depends_on(date_dependency(self.kwargs["year"], self.kwargs["month"]))
+        self.depends_on_items(context["items"])
+        return context
+
+
+class PopularView(PageCacheMixin, TemplateView):
+    template_name = "blog/popular.html"
+
+    def get_context_data(self, **kwargs):
+        period = self.kwargs.get("period", PopularEntry.WEEK)
+        if period not in PopularEntry.HALF_LIVES:
+            raise Http404("Unknown period")
+        context = super(PopularView, self).get_context_data(**kwargs)
+        context["period"] = period
+        context["periods"] = PopularEntry.PERIOD_CHOICES
         return context
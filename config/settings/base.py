@@ -143,6 +143,8 @@ AUTH_PASSWORD_VALIDATORS = [
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#middleware
 MIDDLEWARE = [
+    # Only active when BLOG_QUERY_STATS is set
+    "architectblog.blog.querybudget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -259,6 +261,14 @@ FILEBROWSER_VERSIONS = {
 FILEBROWSER_DIRECTORY = "uploads/"
 DATA_UPLOAD_MAX_MEMORY_SIZE = 2048576
 
+# Background jobs are run by `manage.py run_worker`; when eager, they run
+# in-process as soon as the transaction that queued them commits instead
+BLOG_TASKS_EAGER = env.bool("BLOG_TASKS_EAGER", False)
+
+# Report each response's query count, SQL time and repeated queries in
+# X-Query-* headers and the architectblog.blog.querybudget log
+BLOG_QUERY_STATS = env.bool("BLOG_QUERY_STATS", False)
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
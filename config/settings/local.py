@@ -23,6 +23,19 @@ CACHES = {
     }
 }
 
+# BACKGROUND JOBS
+# ------------------------------------------------------------------------------
+BLOG_TASKS_EAGER = env.bool("BLOG_TASKS_EAGER", True)
+
+# QUERY STATS
+# ------------------------------------------------------------------------------
+BLOG_QUERY_STATS = env.bool("BLOG_QUERY_STATS", True)
+# Only requests over their query budget, unless set to DEBUG
+LOGGING["loggers"]["architectblog.blog.querybudget"] = {  # noqa F405
+    "handlers": ["console"],
+    "level": env("BLOG_QUERY_LOG_LEVEL", default="WARNING"),
+}
+
 # WhiteNoise
 # ------------------------------------------------------------------------------
 # http://whitenoise.evans.io/en/latest/django.html#using-whitenoise-in-development
@@ -8,6 +8,12 @@ SECRET_KEY = env("DJANGO_SECRET_KEY")
 # https://docs.djangoproject.com/en/dev/ref/settings/#allowed-hosts
 ALLOWED_HOSTS = ["*", "127.0.0.1:7000", "127.0.0.1"]
 
+# CACHES
+# ------------------------------------------------------------------------------
+# https://docs.djangoproject.com/en/dev/ref/settings/#caches
+# The default database cache needs `manage.py createcachetable`
+CACHES = {"default": env.cache("CACHE_URL", default="dbcache://blog_cache")}
+
 # STATIC
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#static-root